@@ -0,0 +1,208 @@
+"""
+Headless batch mode: repairs GPS stucks in whole directories of tracks
+and re-exports them without starting the web server.
+
+    python -m backend.batch archive/ -o fixed/ --max-speed 30 --min-points 10
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from multiprocessing import Pool
+from pathlib import Path
+
+from backend.services.track_loader import parse_track, render_track, SUPPORTED_EXTENSIONS
+from backend.services.track_session import TrackSession
+
+# Formats that render_track() can currently write
+EXPORT_FORMATS = ("gpx",)
+
+
+def collect_files(inputs: list[str], recursive: bool = True) -> list[tuple[Path, Path]]:
+    """
+    Expands the input files and directories into (file, root) pairs.
+    The root is used to rebuild the relative layout in the output directory.
+    """
+    files = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            pattern = "**/*" if recursive else "*"
+            for f in sorted(path.glob(pattern)):
+                if f.is_file() and f.suffix.lower() in SUPPORTED_EXTENSIONS:
+                    files.append((f, path))
+        elif path.is_file():
+            files.append((path, path.parent))
+    return files
+
+
+def output_paths(files: list[tuple[Path, Path]], output_dir: Path, fmt: str) -> list[Path]:
+    """
+    Destination of every input: its relative path with the `fmt` suffix. Names that would
+    collide with another output (a.gpx and a.fit) or overwrite an input get the source
+    format appended (a_fit.gpx), then a counter if needed.
+    """
+    sources = {src.resolve() for src, _ in files}
+    taken: set[Path] = set()
+    out = []
+    for src, root in files:
+        rel = src.relative_to(root)
+        dst = output_dir / rel.with_suffix(f".{fmt}")
+        k = 0
+        while dst.resolve() in taken or dst.resolve() in sources:
+            k += 1
+            tag = src.suffix.lstrip(".").lower() + (f"_{k}" if k > 1 else "")
+            dst = output_dir / rel.with_name(f"{rel.stem}_{tag}.{fmt}")
+        taken.add(dst.resolve())
+        out.append(dst)
+    return out
+
+
+def process_file(job: dict) -> dict:
+    """Parses, normalizes and exports a single file. Runs in a worker process."""
+    src = Path(job["src"])
+    result = {
+        "file": str(src),
+        "status": "ok",
+        "points": 0,
+        "stucks": 0,
+        "fixed_points": 0,
+        "seconds": 0.0,
+    }
+    t0 = time.perf_counter()
+    try:
+        track = parse_track(src.read_bytes(), src.name)
+        result["points"] = sum(len(s.points) for s in track.segments)
+
+        session = TrackSession(track)
+        stucks = session.detect_gps_stucks(max_speed=job["max_speed"], min_points=job["min_points"])
+        if stucks:
+            session.normalize_gps_stucks(stucks)
+        result["stucks"] = len(stucks)
+        result["fixed_points"] = sum(len(s.stuck_indices) for s in stucks)
+
+        if not job["dry_run"]:
+            content = render_track(session.current_track, job["fmt"])
+            dst = Path(job["dst"])
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            dst.write_text(content["data"], encoding="utf-8")
+            result["output"] = str(dst)
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - t0
+    return result
+
+
+def run_batch(
+        inputs: list[str],
+        output_dir: str,
+        fmt: str = "gpx",
+        max_speed: float = 30.0,
+        min_points: int = 10,
+        workers: int | None = None,
+        recursive: bool = True,
+        dry_run: bool = False,
+        progress=None,
+) -> dict:
+    """
+    Processes all the inputs with a multiprocessing pool.
+    `progress` is called with (done, total, result) after every file.
+    Returns the summary report.
+    """
+    files = collect_files(inputs, recursive=recursive)
+    jobs = []
+    for (src, _), dst in zip(files, output_paths(files, Path(output_dir), fmt)):
+        jobs.append({
+            "src": str(src),
+            "dst": str(dst),
+            "fmt": fmt,
+            "max_speed": max_speed,
+            "min_points": min_points,
+            "dry_run": dry_run,
+        })
+
+    workers = workers or os.cpu_count() or 1
+    results = []
+    t0 = time.perf_counter()
+
+    if jobs:
+        with Pool(processes=min(workers, len(jobs))) as pool:
+            for res in pool.imap_unordered(process_file, jobs, chunksize=1):
+                results.append(res)
+                if progress:
+                    progress(len(results), len(jobs), res)
+
+    elapsed = time.perf_counter() - t0
+    ok = [r for r in results if r["status"] == "ok"]
+    points = sum(r["points"] for r in ok)
+
+    return {
+        "files": len(results),
+        "ok": len(ok),
+        "failed": len(results) - len(ok),
+        "points": points,
+        "stucks": sum(r["stucks"] for r in ok),
+        "fixed_points": sum(r["fixed_points"] for r in ok),
+        "workers": workers,
+        "elapsed_s": elapsed,
+        "files_per_s": len(results) / elapsed if elapsed else 0.0,
+        "points_per_s": points / elapsed if elapsed else 0.0,
+        "results": sorted(results, key=lambda r: r["file"]),
+    }
+
+
+def _print_progress(done: int, total: int, res: dict):
+    if res["status"] == "ok":
+        info = f"{res['points']} points, {res['stucks']} stucks, {res['seconds']:.2f}s"
+    else:
+        info = res["error"]
+    print(f"[{done}/{total}] {res['status']:6} {res['file']}: {info}", file=sys.stderr, flush=True)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.batch",
+        description="Normalizes GPS stucks in GPX/FIT/TCX files and re-exports them."
+    )
+    parser.add_argument("inputs", nargs="+", help="files or directories to process")
+    parser.add_argument("-o", "--output", required=True, help="output directory")
+    parser.add_argument("-f", "--format", default="gpx", choices=EXPORT_FORMATS, help="export format")
+    parser.add_argument("--max-speed", type=float, default=30.0, help="stuck jump speed threshold, m/s")
+    parser.add_argument("--min-points", type=int, default=10, help="minimal stuck length, points")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--no-recursive", action="store_true", help="do not descend into subdirectories")
+    parser.add_argument("--dry-run", action="store_true", help="detect and normalize, but do not write files")
+    parser.add_argument("--report", help="summary report path (default: <output>/report.json)")
+    args = parser.parse_args(argv)
+
+    report = run_batch(
+        inputs=args.inputs,
+        output_dir=args.output,
+        fmt=args.format,
+        max_speed=args.max_speed,
+        min_points=args.min_points,
+        workers=args.workers,
+        recursive=not args.no_recursive,
+        dry_run=args.dry_run,
+        progress=_print_progress,
+    )
+
+    report_path = Path(args.report or Path(args.output) / "report.json")
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    report_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    print(
+        f"{report['ok']}/{report['files']} files, {report['points']} points, "
+        f"{report['stucks']} stucks fixed in {report['elapsed_s']:.2f}s "
+        f"({report['files_per_s']:.1f} files/s, {report['points_per_s']:.0f} points/s)",
+        file=sys.stderr
+    )
+    print(f"report: {report_path}", file=sys.stderr)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""
+Runtime settings, read from the environment (FYT_* variables).
+"""
+import os
+
+
+def _env_float(name: str, default: float | None) -> float | None:
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+# Requests slower than this (ms) get a profiler dump. Unset = profiling disabled.
+PROFILE_SLOW_MS: float | None = _env_float("FYT_PROFILE_SLOW_MS", None)
+
+# "cprofile" (default) or "pyinstrument" (if installed)
+PROFILER: str = os.environ.get("FYT_PROFILER", "cprofile")
+
+# Where the profiler dumps are written
+PROFILE_DIR: str = os.environ.get("FYT_PROFILE_DIR", "profiles")
+
+# Directory with SRTM .hgt tiles for elevation lookup. Unset = DEM lookup disabled.
+DEM_DIR: str | None = os.environ.get("FYT_DEM_DIR")
+
+# Maximum number of memory-mapped DEM tiles kept open
+DEM_CACHE_TILES: int = int(os.environ.get("FYT_DEM_CACHE_TILES", "16"))
+
+# Preprocessed road graph (python -m backend.services.road_graph build ...). Unset = road reroute disabled.
+ROAD_GRAPH: str | None = os.environ.get("FYT_ROAD_GRAPH")
+
+# Number of cached shortest paths
+ROUTE_CACHE_SIZE: int = int(os.environ.get("FYT_ROUTE_CACHE_SIZE", "1024"))
+
+# Tolerances (meters) of the simplified geometry precomputed after upload, comma separated
+LOD_TOLERANCES: list[float] = [float(v) for v in os.environ.get("FYT_LOD_TOLERANCES", "5,20,100").split(",") if v]
+
+# Min points of the GPS stuck candidates precomputed after upload (the editor default)
+STUCK_MIN_POINTS: int = int(os.environ.get("FYT_STUCK_MIN_POINTS", "10"))
+
+# "development" (default): debug errors and auto-reload. "production": neither, FYT_WORKERS processes.
+ENV: str = os.environ.get("FYT_ENV", "development")
+PRODUCTION: bool = ENV == "production"
+
+# Server address and worker processes, used by run.py.
+# Sessions live in the memory of one worker: with several workers the proxy must route
+# the requests of a session to the same worker (sticky sessions).
+HOST: str = os.environ.get("FYT_HOST", "127.0.0.1")
+PORT: int = int(os.environ.get("FYT_PORT", "8000"))
+WORKERS: int = int(os.environ.get("FYT_WORKERS", "1"))
@@ -1,22 +1,31 @@
 from pathlib import Path
 from fastapi import FastAPI
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, PlainTextResponse
 from starlette.staticfiles import StaticFiles
 
-from backend.routers import track
+from backend import config
+from backend.routers import track, admin
+from backend.services.instrumentation import registry, timing_middleware
 
 app = FastAPI(
     title="fix your fucking track",
-    debug=True
+    debug=not config.PRODUCTION
 )
 
+app.middleware("http")(timing_middleware)
 app.include_router(track.router)
+app.include_router(admin.router)
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 FRONTEND_DIR = BASE_DIR / "frontend"
 
 app.mount("/assets", StaticFiles(directory= FRONTEND_DIR / "dist/assets"), name="assets")
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/", response_class=HTMLResponse)
 def frontend():
     return FileResponse(FRONTEND_DIR / "dist/index.html")
@@ -48,15 +48,31 @@ class TrackMetadata(TypedDict, total=False):
     manufacturer: str | None
     product: str | None
 
+@dataclass(frozen=True)
+class Lap:
+    """A lap marker: a time interval of the track, from the device or from a split."""
+    start_time: datetime
+    end_time: datetime
+    trigger: str | None = None # "manual", "distance", "time", "pause", ... as reported or used for the split
+
+    def to_dict(self):
+        return {
+            "start_time": self.start_time.isoformat(),
+            "end_time": self.end_time.isoformat(),
+            "trigger": self.trigger,
+        }
+
 @dataclass()
 class Track:
     segments: list[TrackSegment]
     metadata: TrackMetadata = field(default_factory=dict)
+    laps: list[Lap] = field(default_factory=list)
 
     def to_dict(self):
         return {
             "segments": [s.to_dict() for s in self.segments],
-            "metadata": dict(self.metadata)
+            "metadata": dict(self.metadata),
+            "laps": [lap.to_dict() for lap in self.laps],
         }
 
 @dataclass()
@@ -66,3 +82,8 @@ class GpsStuck:
     end_idx: int # index of the first normal point after a stuck
     stuck_indices: list[int]
 
+@dataclass()
+class GpsOutliers:
+    segment_idx: int
+    indices: list[int] # points reachable only with an implausible speed/acceleration
+
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+
+from backend.routers.track import session_manager
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+@router.get("/sessions/memory")
+async def sessions_memory(top: int = Query(10, ge=1)):
+    """
+    Estimated memory of all sessions: totals by component and the top consumers.
+    The walk is long on big sessions, so it runs in the threadpool.
+    """
+    return await run_in_threadpool(session_manager.memory_report, top=top)
+
+@router.get("/sessions/{session_id}/memory")
+async def session_memory(session_id: str):
+    footprint = await run_in_threadpool(session_manager.memory, session_id)
+    if footprint is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return footprint
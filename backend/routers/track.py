@@ -1,27 +1,143 @@
+import asyncio
+import logging
 import re
+from datetime import datetime
 from typing import Literal
 
-from fastapi import UploadFile, APIRouter, File, HTTPException
+from fastapi import UploadFile, APIRouter, BackgroundTasks, File, HTTPException, Query, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
 from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
 from urllib.parse import quote
 
-from backend.models.track import GpsStuck
+from backend.models.track import GpsStuck, GpsOutliers, Track
 from backend.schemas.track_requests import (SessionRequest, RerouteRequest, TrimRequest,
                                             InsertPointRequest, UpdateTimeRequest, PreviewNormalizeRequest,
-                                            ApplyNormalizeRequest, RecalcTimesRequest)
+                                            ApplyNormalizeRequest, RecalcTimesRequest, ElevationRequest,
+                                            PreviewFilterRequest, ApplyFilterRequest, ResampleRequest,
+                                            SplitRequest, LiveEditMessage)
 from backend.services.track_loader import load_track, export_track
 from backend.services.track_session import TrackSessionManager
+from backend.services.instrumentation import registry, span
 
 router = APIRouter(prefix="/api/track", tags=["track"])
 session_manager = TrackSessionManager()
+logger = logging.getLogger(__name__)
+
+def track_response(track: Track) -> dict:
+    with span("serialize"):
+        return {"track": track.to_dict()}
+
+@registry.collector
+def session_metrics():
+    stats = session_manager.stats()
+    return [
+        ("fyt_sessions", "gauge", "Live editing sessions",
+         [({}, stats["sessions"])]),
+        ("fyt_session_points", "gauge", "Points in the current track, summed over sessions",
+         [({"stat": "sum"}, sum(stats["points"])), ({"stat": "max"}, max(stats["points"], default=0))]),
+        ("fyt_history_snapshots", "gauge", "History snapshots held by all sessions",
+         [({}, stats["history_snapshots"])]),
+        ("fyt_history_points", "gauge", "Points copied on write, their old versions held by history snapshots",
+         [({}, stats["history_points"])]),
+        ("fyt_history_memory_bytes", "gauge", "Estimated memory of history snapshots",
+         [({}, stats["history_bytes"])]),
+    ]
 
 @router.post("/upload")
-async def upload(file: UploadFile = File(...)):
+async def upload(background_tasks: BackgroundTasks, file: UploadFile = File(...), include_track: bool = True):
+    """
+    Parses the file and opens a session. With include_track=false only the session summary
+    is returned and the points are fetched with /session/{id}/points.
+    Analyses (stuck candidates, distances, metrics, simplified geometry) are precomputed
+    after the response, see /session/{id}/status.
+    """
     track = await load_track(file)
     if track is None:
         raise HTTPException(status_code=400, detail="Unsupported file format")
     session_id = session_manager.create_session(track)
-    return {"session_id": session_id, "track": track.to_dict()}
+    background_tasks.add_task(session_manager.precompute, session_id)
+    if not include_track:
+        return {"session_id": session_id, "summary": session_manager.get(session_id).summary()}
+    return {"session_id": session_id, **track_response(track)}
+
+@router.get("/session/{session_id}")
+async def session_summary(session_id: str):
+    """Metadata and per-segment summaries of the current track."""
+    session = session_manager.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session.summary()
+
+@router.get("/session/{session_id}/points")
+async def session_points(
+        session_id: str,
+        segment_idx: int = 0,
+        start: int = Query(0, ge=0),
+        limit: int = Query(1000, ge=1, le=50000),
+        from_time: datetime | None = None,
+        to_time: datetime | None = None,
+):
+    """
+    Pages points by segment/index range, or by time window when from_time and to_time are given.
+    A time window page continues from its `next` cursor passed as segment_idx and start.
+    """
+    session = session_manager.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if from_time is not None or to_time is not None:
+        if from_time is None or to_time is None:
+            raise HTTPException(status_code=400, detail="Both from_time and to_time are required")
+        return session.points_in_window(from_time, to_time, limit=limit, segment_idx=segment_idx, start=start)
+    if not 0 <= segment_idx < len(session.current_track.segments):
+        raise HTTPException(status_code=404, detail="Segment not found")
+    return session.points_page(segment_idx, start=start, limit=limit)
+
+@router.get("/session/{session_id}/status")
+async def session_status(session_id: str):
+    """Readiness of the precomputed analyses of the session."""
+    session = session_manager.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session.precompute_status()
+
+@router.get("/session/{session_id}/diff")
+async def session_diff(session_id: str, limit: int = Query(1000, ge=1)):
+    """Change map between the original and the current track, at most `limit` ranges."""
+    session = session_manager.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    diff = session.diff()
+    return {**diff, "ranges": diff["ranges"][:limit], "truncated": len(diff["ranges"]) > limit}
+
+@router.get("/session/{session_id}/lod")
+async def session_lod(session_id: str, tolerance: float = Query(20.0, gt=0)):
+    """Simplified geometry of the current track for drawing at low zoom (tolerance in meters)."""
+    session = session_manager.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"tolerance": tolerance, "segments": session.lod(tolerance)}
+
+@router.get("/session/{session_id}/at")
+async def point_at_time(session_id: str, time: datetime):
+    """The point closest to the given time (e.g. to sync a photo or video frame)."""
+    session = session_manager.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    found = session.point_at_time(time)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Track has no timestamps")
+    return found
+
+@router.get("/session/{session_id}/range")
+async def time_range(session_id: str, from_time: datetime, to_time: datetime):
+    """Index ranges of the points between from_time and to_time, per segment."""
+    session = session_manager.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if from_time > to_time:
+        raise HTTPException(status_code=400, detail="from_time must not be after to_time")
+    return {"ranges": session.time_range(from_time, to_time)}
 
 @router.post("/undo")
 async def undo(req: SessionRequest):
@@ -29,7 +145,7 @@ async def undo(req: SessionRequest):
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     session.undo()
-    return {"track": session.current_track.to_dict()}
+    return track_response(session.current_track)
 
 @router.post("/redo")
 async def redo(req: SessionRequest):
@@ -37,7 +153,7 @@ async def redo(req: SessionRequest):
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     session.redo()
-    return {"track": session.current_track.to_dict()}
+    return track_response(session.current_track)
 
 @router.post("/reset")
 async def reset(req: SessionRequest):
@@ -45,7 +161,17 @@ async def reset(req: SessionRequest):
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     session.reset()
-    return {"track": session.current_track.to_dict()}
+    return track_response(session.current_track)
+
+@router.get("/session/{session_id}/stats")
+async def session_stats(session_id: str):
+    """
+    Derived metrics of the current track (distance, moving time, elevation, speed, HR/power).
+    """
+    session = session_manager.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"stats": session.stats()}
 
 @router.post("/normalize/preview")
 async def normalize_preview(req: PreviewNormalizeRequest):
@@ -72,7 +198,81 @@ async def normalize_apply(req: ApplyNormalizeRequest):
         for s in req.stucks
     ]
     session.normalize_gps_stucks(stucks=stucks)
-    return {"track": session.current_track.to_dict()}
+    return track_response(session.current_track)
+
+@router.post("/filter/preview")
+async def filter_preview(req: PreviewFilterRequest):
+    session = session_manager.get(req.session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    outliers = session.detect_noise(max_speed=req.max_speed, max_accel=req.max_accel)
+    return {
+        "outliers": [o.__dict__ for o in outliers]
+    }
+
+@router.post("/filter/apply")
+async def filter_apply(req: ApplyFilterRequest):
+    session = session_manager.get(req.session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    outliers = [
+        GpsOutliers(segment_idx=o.segment_idx, indices=o.indices)
+        for o in req.outliers
+    ]
+    session.filter_noise(
+        outliers=outliers,
+        smooth=req.smooth,
+        measurement_noise=req.measurement_noise,
+        process_noise=req.process_noise
+    )
+    return track_response(session.current_track)
+
+@router.post("/resample")
+async def resample(req: ResampleRequest):
+    session = session_manager.get(req.session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    try:
+        session.resample(mode=req.mode, interval=req.interval, max_points=req.max_points)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return track_response(session.current_track)
+
+@router.post("/split")
+async def split(req: SplitRequest):
+    """Splits the activity into segments or laps at pauses, every distance/time, or at the device laps."""
+    session = session_manager.get(req.session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    try:
+        session.split(mode=req.mode, value=req.value, stop_speed=req.stop_speed, target=req.target)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return track_response(session.current_track)
+
+@router.get("/session/{session_id}/laps")
+async def session_laps(session_id: str):
+    """Lap markers with per-lap distance, times, speed, elevation and HR/cadence/power."""
+    session = session_manager.get(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"laps": session.lap_stats()}
+
+@router.post("/elevation/apply")
+async def elevation_apply(req: ElevationRequest):
+    session = session_manager.get(req.session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    try:
+        session.correct_elevation(
+            method=req.method,
+            window=req.window,
+            polyorder=req.polyorder,
+            use_dem=req.use_dem
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return track_response(session.current_track)
 
 @router.post("/add_point")
 async def add_point(req: InsertPointRequest):
@@ -85,7 +285,7 @@ async def add_point(req: InsertPointRequest):
         lat=req.lat,
         lon=req.lon
     )
-    return {"track": session.current_track.to_dict()}
+    return track_response(session.current_track)
 
 @router.post("/update_time")
 async def update_time(req: UpdateTimeRequest):
@@ -100,22 +300,100 @@ async def update_time(req: UpdateTimeRequest):
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    return {"track": session.current_track.to_dict()}
+    return track_response(session.current_track)
 
 @router.post("/reroute")
 async def reroute_track(req: RerouteRequest):
     session = session_manager.get(req.session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    session.reroute(
-        segment_idx=req.segment_idx,
-        point_idx=req.point_idx,
-        new_lat=req.new_lat,
-        new_lon=req.new_lon,
-        mode=req.mode,
-        radius_m=req.radius_m
-    )
-    return {"track": session.current_track.to_dict()}
+    try:
+        session.reroute(
+            segment_idx=req.segment_idx,
+            point_idx=req.point_idx,
+            new_lat=req.new_lat,
+            new_lon=req.new_lon,
+            mode=req.mode,
+            radius_m=req.radius_m
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return track_response(session.current_track)
+
+@router.websocket("/session/{session_id}/live")
+async def live_edit(websocket: WebSocket, session_id: str):
+    """
+    Live drag channel. The client streams {"type": "drag", ...} positions of a point and gets
+    {"type": "preview"} replies with the patched range (current points start..end replaced by
+    `points`); nothing is committed. Previews are computed in the threadpool on a frozen
+    snapshot while the socket keeps being read; drags arriving meanwhile are coalesced and
+    only the latest is previewed. {"type": "drop"} commits the final position as one reroute
+    (one history entry), {"type": "cancel"} ends the drag without a change.
+    Failed edits get {"type": "error"} replies; any other failure closes the channel.
+    """
+    session = session_manager.get(session_id)
+    if not session:
+        await websocket.close(code=4404, reason="Session not found")
+        return
+    await websocket.accept()
+
+    pending: list[tuple[LiveEditMessage, int]] = [] # messages with the number of drags they replaced
+    wake = asyncio.Event()
+
+    async def receive():
+        while True:
+            try:
+                msg = LiveEditMessage.model_validate(await websocket.receive_json())
+            except (ValidationError, ValueError) as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            if msg.type == "drag" and pending and pending[-1][0].type == "drag":
+                pending[-1] = (msg, pending[-1][1] + 1) # a newer position replaces the one not previewed yet
+            else:
+                pending.append((msg, 0))
+            wake.set()
+
+    async def process():
+        while True:
+            await wake.wait()
+            wake.clear()
+            while pending:
+                msg, coalesced = pending.pop(0)
+                if msg.type == "cancel":
+                    await websocket.send_json({"type": "cancelled", "seq": msg.seq})
+                    continue
+                if None in (msg.segment_idx, msg.point_idx, msg.lat, msg.lon):
+                    await websocket.send_json({
+                        "type": "error", "seq": msg.seq, "detail": "segment_idx, point_idx, lat and lon are required"
+                    })
+                    continue
+                args = (msg.segment_idx, msg.point_idx, msg.lat, msg.lon, msg.mode, msg.radius_m)
+                try:
+                    if msg.type == "drop":
+                        patch = session.reroute(*args) # changes the session: stays on the event loop
+                    else:
+                        # edits on the loop copy what the snapshot holds before changing it
+                        patch = await run_in_threadpool(session.reroute_preview, *args, track=session.frozen_track())
+                except (ValueError, IndexError) as e:
+                    await websocket.send_json({"type": "error", "seq": msg.seq, "detail": str(e)})
+                    continue
+                except Exception:
+                    logger.exception("Live edit failed for session %s", session_id)
+                    await websocket.send_json({"type": "error", "seq": msg.seq, "detail": "Internal error"})
+                    continue
+                reply = "committed" if msg.type == "drop" else "preview"
+                await websocket.send_json({"type": reply, "seq": msg.seq, "coalesced": coalesced, **patch})
+
+    # both loops only end by an exception: a disconnect ends the channel, anything else is raised
+    tasks = [asyncio.create_task(receive()), asyncio.create_task(process())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+    for task in done:
+        if not isinstance(task.exception(), WebSocketDisconnect):
+            raise task.exception()
 
 @router.post("/recalculate_times")
 async def recalc_times(req: RecalcTimesRequest):
@@ -127,7 +405,7 @@ async def recalc_times(req: RecalcTimesRequest):
         end_point_id=req.end_point_id,
         max_deviation=req.max_deviation
     )
-    return {"track": session.current_track.to_dict()}
+    return track_response(session.current_track)
 
 @router.post("/trim")
 async def trim_track(req: TrimRequest):
@@ -135,7 +413,7 @@ async def trim_track(req: TrimRequest):
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     session.trim(start_point_id=req.start_point_id, end_point_id=req.end_point_id)
-    return {"track": session.current_track.to_dict()}
+    return track_response(session.current_track)
 
 @router.post("/merge")
 async def merge_track(session_id: str, file: UploadFile = File(...)):
@@ -144,7 +422,7 @@ async def merge_track(session_id: str, file: UploadFile = File(...)):
         raise HTTPException(status_code=404, detail="Session not found")
     second_track = await load_track(file)
     session.merge_with(second_track)
-    return {"track": session.current_track.to_dict()}
+    return track_response(session.current_track)
 
 def content_disposition(filename: str) -> str:
     ascii_fallback = "".join(
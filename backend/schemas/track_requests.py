@@ -1,5 +1,6 @@
 from datetime import datetime
-from pydantic import BaseModel
+from typing import Literal
+from pydantic import BaseModel, Field
 
 class SessionRequest(BaseModel):
     session_id: str
@@ -19,6 +20,42 @@ class ApplyNormalizeRequest(BaseModel):
     session_id: str
     stucks: list[GpsStucksRequest]
 
+class PreviewFilterRequest(BaseModel):
+    session_id: str
+    max_speed: float
+    max_accel: float
+
+class GpsOutliersRequest(BaseModel):
+    segment_idx: int
+    indices: list[int]
+
+class ApplyFilterRequest(BaseModel):
+    session_id: str
+    outliers: list[GpsOutliersRequest]
+    smooth: bool = True
+    measurement_noise: float = Field(5.0, gt=0) # meters
+    process_noise: float = Field(1.0, gt=0)     # m/s^2
+
+class ResampleRequest(BaseModel):
+    session_id: str
+    mode: Literal["time", "distance"] | None = None
+    interval: float | None = None # seconds or meters
+    max_points: int | None = None
+
+class SplitRequest(BaseModel):
+    session_id: str
+    mode: Literal["pause", "distance", "time", "laps"]
+    value: float | None = None # min pause seconds, meters or seconds
+    stop_speed: float = 0.5 # m/s, slower counts as standing still
+    target: Literal["segments", "laps"] = "segments"
+
+class ElevationRequest(BaseModel):
+    session_id: str
+    method: Literal["median", "savgol", "none"] = "median"
+    window: int = 5
+    polyorder: int = 2
+    use_dem: bool = False
+
 class InsertPointRequest(BaseModel):
     session_id: str
     segment_idx: int
@@ -38,7 +75,7 @@ class RerouteRequest(BaseModel):
     point_idx: int
     new_lat: float
     new_lon: float
-    mode: str = "straight"
+    mode: Literal["straight", "road"] = "straight"
     radius_m: float
 
 class RecalcTimesRequest(BaseModel):
@@ -50,4 +87,15 @@ class RecalcTimesRequest(BaseModel):
 class TrimRequest(BaseModel):
     session_id: str
     start_point_id: str
-    end_point_id: str
\ No newline at end of file
+    end_point_id: str
+
+class LiveEditMessage(BaseModel):
+    """A message on the live edit WebSocket: drag positions, then a drop (commit) or a cancel."""
+    type: Literal["drag", "drop", "cancel"]
+    seq: int | None = None # echoed back so the client can match replies
+    segment_idx: int | None = None # required for drag and drop, like point_idx, lat and lon
+    point_idx: int | None = None
+    lat: float | None = None
+    lon: float | None = None
+    mode: Literal["straight", "road"] = "straight"
+    radius_m: float = Field(50.0, gt=0)
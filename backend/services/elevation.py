@@ -0,0 +1,183 @@
+"""
+Elevation cleanup: smoothing filters and lookup in local SRTM (.hgt) DEM tiles.
+"""
+import math
+import mmap
+import struct
+
+from bisect import insort, bisect_left
+from collections import OrderedDict
+from pathlib import Path
+
+from backend import config
+from backend.models.track import TrackPoint
+
+HGT_VOID = -32768
+
+
+# ---------- Filters ----------
+def median_filter(values: list[float], window: int) -> list[float]:
+    """Running median with edge values repeated; keeps a sorted window (O(n * window))."""
+    n = len(values)
+    if n == 0 or window <= 1:
+        return list(values)
+    half = window // 2
+    padded = [values[0]] * half + list(values) + [values[-1]] * half
+    win = sorted(padded[:2 * half + 1])
+    out = [0.0] * n
+    for i in range(n):
+        out[i] = win[half]
+        if i + 1 < n:
+            del win[bisect_left(win, padded[i])]
+            insort(win, padded[i + 2 * half + 1])
+    return out
+
+
+def savgol_coefficients(window: int, polyorder: int) -> list[float]:
+    """
+    Savitzky-Golay smoothing coefficients for the central point of an odd window:
+    the first row of (A^T A)^-1 A^T, A[i][j] = i^j.
+    """
+    if window % 2 == 0 or window < 3:
+        raise ValueError("Savitzky-Golay window must be odd and >= 3")
+    if not 0 <= polyorder < window:
+        raise ValueError("polyorder must be less than the window size")
+    half = window // 2
+    xs = range(-half, half + 1)
+    k = polyorder + 1
+
+    # normal equations (A^T A) c = e0, solved by Gauss-Jordan elimination
+    m = [[float(sum(x ** (r + c) for x in xs)) for c in range(k)] + [1.0 if r == 0 else 0.0] for r in range(k)]
+    for col in range(k):
+        pivot = max(range(col, k), key=lambda r: abs(m[r][col]))
+        m[col], m[pivot] = m[pivot], m[col]
+        p = m[col][col]
+        m[col] = [v / p for v in m[col]]
+        for r in range(k):
+            if r != col and m[r][col]:
+                f = m[r][col]
+                m[r] = [a - f * b for a, b in zip(m[r], m[col])]
+    sol = [m[r][k] for r in range(k)]
+
+    return [sum(sol[j] * x ** j for j in range(k)) for x in xs]
+
+
+def savgol_filter(values: list[float], window: int, polyorder: int) -> list[float]:
+    """Savitzky-Golay smoothing with edge values repeated."""
+    n = len(values)
+    if n == 0:
+        return []
+    coeffs = savgol_coefficients(window, polyorder)
+    half = window // 2
+    padded = [values[0]] * half + list(values) + [values[-1]] * half
+    # one pass per coefficient over shifted views instead of a window per point
+    out = [0.0] * n
+    for k, c in enumerate(coeffs):
+        out = [o + c * v for o, v in zip(out, padded[k:k + n])]
+    return out
+
+
+FILTERS = {
+    "median": lambda values, window, polyorder: median_filter(values, window),
+    "savgol": savgol_filter,
+}
+
+
+def smooth_values(values: list[float | None], method: str, window: int, polyorder: int = 2) -> list[float | None]:
+    """Smoothed elevation values; None values are skipped and stay None."""
+    if method not in FILTERS:
+        raise ValueError(f"Unknown smoothing method: {method}")
+    known = [i for i, v in enumerate(values) if v is not None]
+    smoothed = FILTERS[method]([values[i] for i in known], window, polyorder)
+    out: list[float | None] = [None] * len(values)
+    for i, v in zip(known, smoothed):
+        out[i] = v
+    return out
+
+
+# ---------- DEM ----------
+class HgtTile:
+    """A memory-mapped SRTM .hgt tile (big-endian int16, rows from north to south)."""
+    def __init__(self, path: Path, lat0: int, lon0: int):
+        self.lat0 = lat0
+        self.lon0 = lon0
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = math.isqrt(len(self._mm) // 2) # 1201 (SRTM3) or 3601 (SRTM1)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def _sample(self, row: int, col: int) -> int | None:
+        v = struct.unpack_from(">h", self._mm, 2 * (row * self.size + col))[0]
+        return None if v == HGT_VOID else v
+
+    def elevation(self, lat: float, lon: float) -> float | None:
+        """Bilinear interpolation of the four surrounding samples."""
+        cells = self.size - 1
+        y = (self.lat0 + 1 - lat) * cells
+        x = (lon - self.lon0) * cells
+        r0 = min(int(y), cells - 1)
+        c0 = min(int(x), cells - 1)
+        fy, fx = y - r0, x - c0
+
+        samples = (
+            self._sample(r0, c0), self._sample(r0, c0 + 1),
+            self._sample(r0 + 1, c0), self._sample(r0 + 1, c0 + 1),
+        )
+        if None in samples:
+            known = [s for s in samples if s is not None]
+            return sum(known) / len(known) if known else None
+        v00, v01, v10, v11 = samples
+        top = v00 + (v01 - v00) * fx
+        bottom = v10 + (v11 - v10) * fx
+        return top + (bottom - top) * fy
+
+
+def hgt_name(lat: float, lon: float) -> tuple[str, int, int]:
+    lat0 = math.floor(lat)
+    lon0 = math.floor(lon)
+    name = f"{'N' if lat0 >= 0 else 'S'}{abs(lat0):02d}{'E' if lon0 >= 0 else 'W'}{abs(lon0):03d}.hgt"
+    return name, lat0, lon0
+
+
+class DemTileCache:
+    """LRU cache of open HgtTile objects from a local directory."""
+    def __init__(self, directory: str | Path, max_tiles: int = 16):
+        self.directory = Path(directory)
+        self.max_tiles = max_tiles
+        self._tiles: OrderedDict[str, HgtTile | None] = OrderedDict()
+
+    def tile(self, lat: float, lon: float) -> HgtTile | None:
+        name, lat0, lon0 = hgt_name(lat, lon)
+        if name in self._tiles:
+            self._tiles.move_to_end(name)
+            return self._tiles[name]
+
+        path = self.directory / name
+        tile = HgtTile(path, lat0, lon0) if path.is_file() else None
+        self._tiles[name] = tile
+        if len(self._tiles) > self.max_tiles:
+            _, old = self._tiles.popitem(last=False)
+            if old:
+                old.close()
+        return tile
+
+    def elevation(self, lat: float, lon: float) -> float | None:
+        tile = self.tile(lat, lon)
+        return tile.elevation(lat, lon) if tile else None
+
+    def lookup(self, points: list[TrackPoint]) -> list[float | None]:
+        """DEM elevation for every point, None where no tile or only voids."""
+        return [self.elevation(p.lat, p.lon) for p in points]
+
+
+_dem_cache: DemTileCache | None = None
+
+def dem_cache() -> DemTileCache | None:
+    """Shared tile cache over FYT_DEM_DIR, None if no DEM directory is configured."""
+    global _dem_cache
+    if _dem_cache is None and config.DEM_DIR:
+        _dem_cache = DemTileCache(config.DEM_DIR, max_tiles=config.DEM_CACHE_TILES)
+    return _dem_cache
@@ -0,0 +1,170 @@
+"""
+Whole-track GPS noise filtering: speed/acceleration outlier detection and a
+constant-velocity Kalman filter with Rauch-Tung-Striebel smoothing.
+
+Positions are projected to local meters per segment. Both axes share the
+same timing, so the covariance recursion is computed once and its gains
+are applied to x and y together.
+"""
+import math
+
+from backend.models.track import TrackPoint
+
+EARTH_R = 6371008.8 # meters
+MIN_DT = 1e-3 # seconds
+
+
+def _project(points: list[TrackPoint]) -> tuple[list[float], list[float], float, float, float]:
+    """Equirectangular projection around the first point, in meters."""
+    lat0, lon0 = points[0].lat, points[0].lon
+    ky = math.radians(1) * EARTH_R
+    kx = ky * math.cos(math.radians(lat0))
+    xs = [(p.lon - lon0) * kx for p in points]
+    ys = [(p.lat - lat0) * ky for p in points]
+    return xs, ys, lat0, lon0, kx
+
+
+def _times(points: list[TrackPoint]) -> list[float]:
+    """Seconds from the first point; points without time are spaced 1 s apart."""
+    t0 = points[0].time
+    out = []
+    last = 0.0
+    for p in points:
+        last = (p.time - t0).total_seconds() if p.time and t0 else last + 1.0
+        out.append(last)
+    return out
+
+
+def detect_outliers(points: list[TrackPoint], max_speed: float, max_accel: float, max_run: int = 10) -> list[int]:
+    """
+    Indices of points which can only be reached from the last good point faster than
+    max_speed (m/s) or with a speed change above max_accel (m/s^2).
+    After max_run outliers in a row the reference is assumed wrong and is reset; if the
+    reference itself was never reached consistently (e.g. a spike on the first fix), it is
+    reported instead. The speed change is only tested once a speed is known.
+    """
+    n = len(points)
+    if n < 3:
+        return []
+    xs, ys, _, _, _ = _project(points)
+    ts = _times(points)
+
+    outliers = []
+    good = 0
+    good_v: float | None = None # speed at the reference, None until one is known
+    confirmed = False # the reference was reached from an earlier good point
+    run = []
+    for i in range(1, n):
+        dt = max(ts[i] - ts[good], MIN_DT)
+        v = math.hypot(xs[i] - xs[good], ys[i] - ys[good]) / dt
+        if v > max_speed or (good_v is not None and abs(v - good_v) / dt > max_accel):
+            run.append(i)
+            if len(run) <= max_run:
+                continue
+            # a long run means the reference was the odd one: restart from here
+            if not confirmed:
+                outliers.append(good)
+            run = []
+            good, good_v, confirmed = i, None, False
+            continue
+        if run:
+            outliers.extend(run)
+            run = []
+        good, good_v, confirmed = i, v, True
+    # a run reaching the end has no good point after it, but is still short
+    outliers.extend(run)
+    return sorted(outliers)
+
+
+def kalman_smooth(
+        points: list[TrackPoint],
+        skip: set[int] | None = None,
+        measurement_noise: float = 5.0, # meters (std)
+        process_noise: float = 1.0,     # m/s^2 (std of the acceleration)
+) -> tuple[list[float], list[float]]:
+    """
+    Constant-velocity Kalman filter + RTS smoother over lat/lon/time.
+    Measurements at `skip` indices are ignored (predicted through).
+    Returns the smoothed latitudes and longitudes of the points.
+    """
+    n = len(points)
+    if n < 3:
+        return [p.lat for p in points], [p.lon for p in points]
+    skip = skip or set()
+    xs, ys, lat0, lon0, kx = _project(points)
+    ts = _times(points)
+    dts = [t1 - t0 if t1 - t0 > MIN_DT else MIN_DT for t0, t1 in zip(ts, ts[1:])] # dts[k - 1]: step to k
+    r = measurement_noise ** 2
+    q = process_noise ** 2
+
+    # filtered state (px, vx, py, vy), shared covariance (a b; b d), predicted values
+    fpx, fvx, fpy, fvy = [0.0] * n, [0.0] * n, [0.0] * n, [0.0] * n
+    fa, fb, fd = [0.0] * n, [0.0] * n, [0.0] * n
+    ppx, pvx, ppy, pvy = [0.0] * n, [0.0] * n, [0.0] * n, [0.0] * n
+    pa, pb, pd = [0.0] * n, [0.0] * n, [0.0] * n
+
+    px, vx, py, vy = xs[0], 0.0, ys[0], 0.0
+    a, b, d = r, 0.0, 100.0
+    fpx[0], fvx[0], fpy[0], fvy[0], fa[0], fb[0], fd[0] = px, vx, py, vy, a, b, d
+
+    for k in range(1, n):
+        dt = dts[k - 1]
+        dt2 = dt * dt
+        # predict
+        px += vx * dt
+        py += vy * dt
+        a = a + 2 * dt * b + dt2 * d + q * dt2 * dt / 3
+        b = b + dt * d + q * dt2 / 2
+        d = d + q * dt
+        # plain stores: a 7-tuple assignment would allocate a tuple per step
+        ppx[k] = px
+        pvx[k] = vx
+        ppy[k] = py
+        pvy[k] = vy
+        pa[k] = a
+        pb[k] = b
+        pd[k] = d
+
+        # update
+        if k not in skip:
+            s = a + r
+            k0, k1 = a / s, b / s
+            ex, ey = xs[k] - px, ys[k] - py
+            px += k0 * ex
+            vx += k1 * ex
+            py += k0 * ey
+            vy += k1 * ey
+            a, b, d = (1 - k0) * a, (1 - k0) * b, d - k1 * b
+        fpx[k] = px
+        fvx[k] = vx
+        fpy[k] = py
+        fvy[k] = vy
+        fa[k] = a
+        fb[k] = b
+        fd[k] = d
+
+    # RTS backward pass: x_s[k] = x_f[k] + C (x_s[k+1] - x_p[k+1]), C = P_f F^T P_p^-1
+    sx, svx, sy, svy = fpx[-1], fvx[-1], fpy[-1], fvy[-1]
+    out_x, out_y = [0.0] * n, [0.0] * n
+    out_x[-1], out_y[-1] = sx, sy
+    for k in range(n - 2, -1, -1):
+        dt = dts[k]
+        a, b, d = fa[k], fb[k], fd[k]
+        m00, m01, m10, m11 = a + dt * b, b, b + dt * d, d
+        qa, qb, qd = pa[k + 1], pb[k + 1], pd[k + 1]
+        det = qa * qd - qb * qb
+        c00 = (m00 * qd - m01 * qb) / det
+        c01 = (m01 * qa - m00 * qb) / det
+        c10 = (m10 * qd - m11 * qb) / det
+        c11 = (m11 * qa - m10 * qb) / det
+
+        ex, evx = sx - ppx[k + 1], svx - pvx[k + 1]
+        ey, evy = sy - ppy[k + 1], svy - pvy[k + 1]
+        sx = fpx[k] + c00 * ex + c01 * evx
+        svx = fvx[k] + c10 * ex + c11 * evx
+        sy = fpy[k] + c00 * ey + c01 * evy
+        svy = fvy[k] + c10 * ey + c11 * evy
+        out_x[k], out_y[k] = sx, sy
+
+    ky = math.radians(1) * EARTH_R
+    return [lat0 + y / ky for y in out_y], [lon0 + x / kx for x in out_x]
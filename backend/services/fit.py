@@ -1,12 +1,15 @@
 import fitdecode
 
-from backend.models.track import Track, TrackSegment, TrackPoint, TrackMetadata
+from datetime import timedelta
+
+from backend.models.track import Track, TrackSegment, TrackPoint, TrackMetadata, Lap
 
 def load_fit(content: bytes) -> Track:
     metadata: TrackMetadata = {
         "format": "fit"
     }
     seg_points: list[TrackPoint] = []
+    laps: list[Lap] = []
 
     with fitdecode.FitReader(content) as fit:
         for frame in fit:
@@ -31,6 +34,16 @@ def load_fit(content: bytes) -> Track:
                         metadata["duration"] = float(f.value)
                     elif f.name == "total_distance":
                         metadata["distance"] = float(f.value)
+            # ---- LAP (device laps, kept as markers) ----
+            elif frame.name == "lap":
+                d = {f.name: f.value for f in frame.fields}
+                start = d.get("start_time")
+                end = d.get("timestamp")
+                if start and d.get("total_elapsed_time") is not None:
+                    end = start + timedelta(seconds=float(d["total_elapsed_time"]))
+                if start and end:
+                    trigger = d.get("lap_trigger")
+                    laps.append(Lap(start_time=start, end_time=end, trigger=str(trigger) if trigger is not None else None))
             # ---- RECORD (GPS points) ----
             elif frame.name == "record":
                 d = {f.name: f.value for f in frame.fields}
@@ -56,5 +69,6 @@ def load_fit(content: bytes) -> Track:
     print(metadata)
     return Track(
         segments=[TrackSegment(points=seg_points)],
-        metadata=metadata
+        metadata=metadata,
+        laps=laps
     )
\ No newline at end of file
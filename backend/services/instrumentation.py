@@ -0,0 +1,231 @@
+"""
+Request timing, internal spans, Prometheus-style metrics and opt-in profiling.
+
+    with span("parse"):
+        ...
+
+Spans are collected per request (Server-Timing header) and aggregated into
+latency histograms exposed on /metrics.
+"""
+import cProfile
+import functools
+import threading
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable
+
+from backend import config
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (name, type, help, [(labels, value), ...])
+MetricFamily = tuple[str, str, str, list[tuple[dict, float]]]
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    def escape(v) -> str:
+        return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    body = ",".join(f'{k}="{escape(v)}"' for k, v in sorted(labels.items()))
+    return "{" + body + "}"
+
+
+class Histogram:
+    """Cumulative histogram with Prometheus semantics."""
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {} # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(dict(k), list(v)) for k, v in self._series.items()]
+        for labels, series in items:
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_labels({**labels, 'le': bound})} {count}")
+            lines.append(f"{self.name}_bucket{_labels({**labels, 'le': '+Inf'})} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(labels)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Histograms updated on the fly plus collectors evaluated at scrape time."""
+    def __init__(self):
+        self._histograms: list[Histogram] = []
+        self._collectors: list[Callable[[], list[MetricFamily]]] = []
+
+    def histogram(self, name: str, help: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        h = Histogram(name, help, buckets)
+        self._histograms.append(h)
+        return h
+
+    def collector(self, fn: Callable[[], list[MetricFamily]]):
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        for h in self._histograms:
+            lines.extend(h.render())
+        for fn in self._collectors:
+            for name, kind, help, samples in fn():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.histogram(
+    "fyt_http_request_duration_seconds", "HTTP request latency by route"
+)
+SPAN_LATENCY = registry.histogram(
+    "fyt_span_duration_seconds", "Duration of internal spans (parsing, edits, history, serialization)"
+)
+
+# Spans of the current request: [(name, seconds), ...]
+_timings: ContextVar[list | None] = ContextVar("fyt_timings", default=None)
+
+
+@contextmanager
+def span(name: str):
+    """Times a block: feeds the span histogram and the current request's Server-Timing."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        SPAN_LATENCY.observe(dt, span=name)
+        timings = _timings.get()
+        if timings is not None:
+            timings.append((name, dt))
+
+
+def timed(name: str):
+    """Decorator version of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def server_timing(timings: list[tuple[str, float]], total: float) -> str:
+    """Builds the Server-Timing header value, repeated spans are summed."""
+    agg: dict[str, float] = {}
+    for name, dt in timings:
+        agg[name] = agg.get(name, 0.0) + dt
+    parts = [f"{name};dur={dt * 1000:.2f}" for name, dt in agg.items()]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+# Only one request is profiled at a time: profilers hook the interpreter globally
+# (on 3.12+ a second cProfile fails with "Another profiling tool is already active")
+_profiling = threading.Lock()
+
+
+class Profiler:
+    """
+    Opt-in request profiler (FYT_PROFILE_SLOW_MS). It profiles the whole event loop
+    thread, so concurrent requests may show up in a dump too. Requests overlapping
+    a profiled one are not profiled.
+    """
+    def __init__(self):
+        self._pyinstrument = None
+        self._cprofile = None
+        if config.PROFILER == "pyinstrument":
+            try:
+                from pyinstrument import Profiler as PyinstrumentProfiler
+                self._pyinstrument = PyinstrumentProfiler(async_mode="enabled")
+            except ImportError:
+                pass
+        if self._pyinstrument is None:
+            self._cprofile = cProfile.Profile()
+
+    def start(self):
+        if self._pyinstrument:
+            self._pyinstrument.start()
+        else:
+            self._cprofile.enable()
+
+    def stop(self):
+        if self._pyinstrument:
+            self._pyinstrument.stop()
+        else:
+            self._cprofile.disable()
+
+    def dump(self, label: str) -> Path:
+        out_dir = Path(config.PROFILE_DIR)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        if self._pyinstrument:
+            path = out_dir / f"{stamp}-{label}.html"
+            path.write_text(self._pyinstrument.output_html(), encoding="utf-8")
+        else:
+            path = out_dir / f"{stamp}-{label}.prof"
+            self._cprofile.dump_stats(path)
+        return path
+
+
+async def timing_middleware(request, call_next):
+    """
+    HTTP middleware: collects the request spans, adds the Server-Timing header,
+    observes the route latency and dumps a profile for slow requests if enabled.
+    """
+    timings: list[tuple[str, float]] = []
+    token = _timings.set(timings)
+    profiler = None
+    if config.PROFILE_SLOW_MS is not None and _profiling.acquire(blocking=False):
+        try:
+            profiler = Profiler()
+            profiler.start()
+        except Exception:
+            _profiling.release()
+            raise
+
+    t0 = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _timings.reset(token)
+        if profiler:
+            profiler.stop()
+            _profiling.release()
+    total = time.perf_counter() - t0
+
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", "unmatched")
+    REQUEST_LATENCY.observe(total, method=request.method, route=route_path)
+
+    if profiler and total * 1000 >= config.PROFILE_SLOW_MS:
+        label = route_path.strip("/").replace("/", "_") or "root"
+        profiler.dump(f"{request.method}-{label}")
+
+    response.headers["Server-Timing"] = server_timing(timings, total)
+    return response
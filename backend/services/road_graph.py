@@ -0,0 +1,254 @@
+"""
+Offline road graph for "snap to road" reroutes.
+
+An OSM XML extract is preprocessed once into a compact CSR graph file:
+
+    python -m backend.services.road_graph build extract.osm roads.fytg
+
+At runtime the graph is loaded from FYT_ROAD_GRAPH, nodes are looked up
+through a grid index and routes are found with A* and kept in an LRU cache.
+"""
+import heapq
+import math
+import struct
+import sys
+import threading
+import xml.etree.ElementTree as ET
+
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+
+from backend import config
+
+MAGIC = b"FYTG1\n"
+EARTH_R = 6371008.8 # meters
+GRID_CELL = 0.005 # degrees, ~500 m
+
+# highway=* values considered routable
+ROUTABLE = {
+    "motorway", "trunk", "primary", "secondary", "tertiary", "unclassified", "residential",
+    "motorway_link", "trunk_link", "primary_link", "secondary_link", "tertiary_link",
+    "living_street", "service", "road", "track", "path", "cycleway", "footway", "bridleway", "steps",
+}
+
+
+def distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Haversine distance in meters."""
+    p1 = math.radians(lat1)
+    p2 = math.radians(lat2)
+    h = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_R * math.asin(math.sqrt(h))
+
+
+class RoadGraph:
+    """
+    Directed graph in CSR form: the edges of node u are
+    targets[offsets[u]:offsets[u + 1]] with lengths in meters in weights.
+    """
+    def __init__(self, lat: array, lon: array, offsets: array, targets: array, weights: array,
+                 cache_size: int = 1024):
+        self.lat = lat
+        self.lon = lon
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self._grid: dict[tuple[int, int], list[int]] = {}
+        for i in range(len(lat)):
+            self._grid.setdefault(self._cell(lat[i], lon[i]), []).append(i)
+        self._cache: OrderedDict[tuple[int, int], list[int] | None] = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock() # routes are also searched from threadpool previews
+
+    def __len__(self):
+        return len(self.lat)
+
+    # ---------- building / storage ----------
+    @classmethod
+    def from_edges(cls, coords: list[tuple[float, float]], edges: list[tuple[int, int]], **kwargs) -> "RoadGraph":
+        n = len(coords)
+        counts = [0] * (n + 1)
+        for u, _ in edges:
+            counts[u + 1] += 1
+        offsets = array("q", [0]) * (n + 1)
+        for i in range(n):
+            offsets[i + 1] = offsets[i] + counts[i + 1]
+
+        targets = array("q", [0]) * len(edges)
+        weights = array("f", [0.0]) * len(edges)
+        fill = list(offsets[:-1])
+        for u, v in edges:
+            k = fill[u]
+            targets[k] = v
+            weights[k] = distance(coords[u][0], coords[u][1], coords[v][0], coords[v][1])
+            fill[u] += 1
+
+        lat = array("d", (c[0] for c in coords))
+        lon = array("d", (c[1] for c in coords))
+        return cls(lat, lon, offsets, targets, weights, **kwargs)
+
+    @classmethod
+    def from_osm(cls, path: str | Path, **kwargs) -> "RoadGraph":
+        """Builds the graph from an OSM XML extract (routable highways only)."""
+        node_coords: dict[int, tuple[float, float]] = {}
+        ways: list[tuple[list[int], str]] = []
+
+        for _, elem in ET.iterparse(path, events=("end",)):
+            if elem.tag == "node":
+                node_coords[int(elem.get("id"))] = (float(elem.get("lat")), float(elem.get("lon")))
+                elem.clear()
+            elif elem.tag == "way":
+                tags = {t.get("k"): t.get("v") for t in elem.findall("tag")}
+                if tags.get("highway") in ROUTABLE:
+                    refs = [int(nd.get("ref")) for nd in elem.findall("nd")]
+                    ways.append((refs, tags.get("oneway", "no")))
+                elem.clear()
+
+        index: dict[int, int] = {}
+        coords: list[tuple[float, float]] = []
+        edges: list[tuple[int, int]] = []
+        for refs, oneway in ways:
+            refs = [r for r in refs if r in node_coords]
+            if oneway == "-1":
+                refs.reverse()
+            ids = []
+            for r in refs:
+                if r not in index:
+                    index[r] = len(coords)
+                    coords.append(node_coords[r])
+                ids.append(index[r])
+            for u, v in zip(ids, ids[1:]):
+                edges.append((u, v))
+                if oneway not in ("yes", "true", "1", "-1"):
+                    edges.append((v, u))
+
+        return cls.from_edges(coords, edges, **kwargs)
+
+    def save(self, path: str | Path):
+        with open(path, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<qq", len(self.lat), len(self.targets)))
+            for arr in (self.lat, self.lon, self.offsets, self.targets, self.weights):
+                arr.tofile(f)
+
+    @classmethod
+    def load(cls, path: str | Path, **kwargs) -> "RoadGraph":
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Not a road graph file: {path}")
+            n_nodes, n_edges = struct.unpack("<qq", f.read(16))
+            arrays = []
+            for code, count in (("d", n_nodes), ("d", n_nodes), ("q", n_nodes + 1), ("q", n_edges), ("f", n_edges)):
+                arr = array(code)
+                arr.fromfile(f, count)
+                arrays.append(arr)
+        return cls(*arrays, **kwargs)
+
+    # ---------- spatial index ----------
+    @staticmethod
+    def _cell(lat: float, lon: float) -> tuple[int, int]:
+        return int(math.floor(lat / GRID_CELL)), int(math.floor(lon / GRID_CELL))
+
+    def nearest(self, lat: float, lon: float, max_rings: int = 4) -> int | None:
+        """Closest node within `max_rings` grid cells around the position."""
+        ci, cj = self._cell(lat, lon)
+        # narrowest cell side in meters over the searched rings (east-west, away from the equator)
+        edge_lat = min(90.0, abs(lat) + (max_rings + 1) * GRID_CELL)
+        cell_m = math.radians(GRID_CELL) * EARTH_R * min(1.0, math.cos(math.radians(edge_lat)))
+        best, best_d = None, math.inf
+        for ring in range(max_rings + 1):
+            for i in range(ci - ring, ci + ring + 1):
+                for j in range(cj - ring, cj + ring + 1):
+                    if max(abs(i - ci), abs(j - cj)) != ring:
+                        continue
+                    for node in self._grid.get((i, j), ()):
+                        d = distance(lat, lon, self.lat[node], self.lon[node])
+                        if d < best_d:
+                            best, best_d = node, d
+            # nodes beyond this ring are at least `ring` whole cells away
+            if ring * cell_m >= best_d:
+                break
+        return best
+
+    # ---------- routing ----------
+    def shortest_path(self, src: int, dst: int) -> list[int] | None:
+        """A* with the straight-line distance as heuristic. Results are cached."""
+        key = (src, dst)
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        path = self._astar(src, dst)
+        with self._cache_lock:
+            self._cache[key] = path
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return path
+
+    def _astar(self, src: int, dst: int) -> list[int] | None:
+        lat, lon = self.lat, self.lon
+        offsets, targets, weights = self.offsets, self.targets, self.weights
+        dlat, dlon = lat[dst], lon[dst]
+
+        g = {src: 0.0}
+        prev: dict[int, int] = {}
+        heap = [(distance(lat[src], lon[src], dlat, dlon), src)]
+        closed = set()
+        while heap:
+            _, u = heapq.heappop(heap)
+            if u == dst:
+                path = [u]
+                while u in prev:
+                    u = prev[u]
+                    path.append(u)
+                path.reverse()
+                return path
+            if u in closed:
+                continue
+            closed.add(u)
+            gu = g[u]
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                gv = gu + weights[k]
+                if gv < g.get(v, math.inf):
+                    g[v] = gv
+                    prev[v] = u
+                    heapq.heappush(heap, (gv + distance(lat[v], lon[v], dlat, dlon), v))
+        return None
+
+    def route(self, lat1: float, lon1: float, lat2: float, lon2: float) -> list[tuple[float, float]] | None:
+        """Road geometry between two positions (snapped to the nearest nodes)."""
+        src = self.nearest(lat1, lon1)
+        dst = self.nearest(lat2, lon2)
+        if src is None or dst is None:
+            return None
+        path = self.shortest_path(src, dst)
+        if path is None:
+            return None
+        return [(self.lat[i], self.lon[i]) for i in path]
+
+
+_graph: RoadGraph | None = None
+
+def road_graph() -> RoadGraph | None:
+    """The graph from FYT_ROAD_GRAPH, loaded on first use. None if not configured."""
+    global _graph
+    if _graph is None and config.ROAD_GRAPH:
+        _graph = RoadGraph.load(config.ROAD_GRAPH, cache_size=config.ROUTE_CACHE_SIZE)
+    return _graph
+
+
+def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 3 or argv[0] != "build":
+        print("usage: python -m backend.services.road_graph build <extract.osm> <output.fytg>", file=sys.stderr)
+        return 2
+    graph = RoadGraph.from_osm(argv[1])
+    graph.save(argv[2])
+    print(f"{len(graph)} nodes, {len(graph.targets)} edges -> {argv[2]}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Memory accounting for track sessions.
+Objects shared between components (e.g. the same point in two tracks)
+are counted once, in the first component that references them.
+"""
+import sys
+
+from backend.models.track import Track
+
+# Caches and indexes a session derives from its current track
+DERIVED_ATTRS = ("metrics", "_cache")
+
+
+def deep_sizeof(obj, seen: set[int]) -> int:
+    """Size of an object graph in bytes, skipping objects already in `seen`."""
+    size = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        oid = id(o)
+        if oid in seen or isinstance(o, type):
+            continue
+        seen.add(oid)
+        size += sys.getsizeof(o)
+
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif hasattr(o, "__dict__"):
+            stack.append(o.__dict__)
+    return size
+
+
+def _count_points(track: Track) -> int:
+    return sum(len(seg.points) for seg in track.segments)
+
+
+def session_footprint(session) -> dict:
+    """
+    Estimated footprint of a TrackSession by component, in bytes.
+    History only gets what is not shared with the original and current tracks.
+    """
+    seen: set[int] = set()
+    original = deep_sizeof(session.original_track, seen)
+    current = deep_sizeof(session.current_track, seen)
+    history = deep_sizeof(session._history, seen)
+    derived = sum(deep_sizeof(getattr(session, attr), seen) for attr in DERIVED_ATTRS)
+    return {
+        "points": _count_points(session.current_track),
+        "history_snapshots": len(session._history),
+        "original_bytes": original,
+        "current_bytes": current,
+        "history_bytes": history,
+        "derived_bytes": derived,
+        "total_bytes": original + current + history + derived,
+    }
+
+
+def memory_report(sessions: dict, top: int = 10) -> dict:
+    """Totals over all sessions plus the `top` largest ones."""
+    footprints = [
+        {"session_id": sid, **session_footprint(s)}
+        for sid, s in list(sessions.items())
+    ]
+    footprints.sort(key=lambda f: f["total_bytes"], reverse=True)
+
+    totals = {"sessions": len(footprints)}
+    for key in ("points", "history_snapshots", "original_bytes", "current_bytes",
+                "history_bytes", "derived_bytes", "total_bytes"):
+        totals[key] = sum(f[key] for f in footprints)
+
+    return {"totals": totals, "top": footprints[:top]}
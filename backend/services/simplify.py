@@ -0,0 +1,52 @@
+"""
+Level-of-detail geometry: Ramer-Douglas-Peucker simplification of a segment.
+Used to draw long tracks at low zoom with a fraction of the points.
+"""
+import math
+
+from backend.models.track import TrackPoint
+
+EARTH_R = 6371008.8 # meters
+
+
+def _segment_distance(px: float, py: float, ax: float, ay: float, bx: float, by: float) -> float:
+    """Distance from p to the segment a-b."""
+    dx, dy = bx - ax, by - ay
+    length2 = dx * dx + dy * dy
+    if length2 == 0:
+        return math.hypot(px - ax, py - ay)
+    t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length2))
+    return math.hypot(px - ax - t * dx, py - ay - t * dy)
+
+
+def simplify(points: list[TrackPoint], tolerance: float) -> list[int]:
+    """
+    Indices of the points kept by RDP with `tolerance` meters (first and last always kept).
+    Iterative, positions are projected to local meters around the first point.
+    """
+    n = len(points)
+    if n < 3:
+        return list(range(n))
+    ky = math.radians(1) * EARTH_R
+    kx = ky * math.cos(math.radians(points[0].lat))
+    xs = [p.lon * kx for p in points]
+    ys = [p.lat * ky for p in points]
+
+    keep = bytearray(n)
+    keep[0] = keep[n - 1] = 1
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        ax, ay, bx, by = xs[a], ys[a], xs[b], ys[b]
+        best, best_d = -1, tolerance
+        for i in range(a + 1, b):
+            d = _segment_distance(xs[i], ys[i], ax, ay, bx, by)
+            if d > best_d:
+                best, best_d = i, d
+        if best > 0:
+            keep[best] = 1
+            if best - a > 1:
+                stack.append((a, best))
+            if b - best > 1:
+                stack.append((best, b))
+    return [i for i in range(n) if keep[i]]
@@ -0,0 +1,58 @@
+"""
+Splitting long activities: pause detection and split points by pause, distance or time.
+
+Everything works on the per-step arrays of SegmentMetrics (one pass or a bisection
+per split), so no point objects are touched until the segments are actually cut.
+"""
+from bisect import bisect_left
+
+from backend.services.track_metrics import SegmentMetrics
+
+
+def detect_pauses(metrics: SegmentMetrics, min_pause: float = 60.0, stop_speed: float = 0.5) -> list[tuple[int, int]]:
+    """
+    Pauses as (first, last) point indices: a time gap of at least min_pause seconds
+    between two points (device auto-pause), or a run of steps slower than stop_speed (m/s)
+    lasting at least min_pause seconds. `last` is the point where the movement resumes.
+    """
+    dist, dt = metrics.dist, metrics.dt
+    pauses = []
+    run_start = None
+    run_time = 0.0
+    for k in range(1, len(dist) + 1):
+        slow = k < len(dist) and dt[k] > 0 and (dt[k] >= min_pause or dist[k] / dt[k] < stop_speed)
+        if slow:
+            if run_start is None:
+                run_start, run_time = k, 0.0
+            run_time += dt[k]
+            continue
+        if run_start is not None and run_time >= min_pause:
+            pauses.append((run_start - 1, k - 1))
+        run_start = None
+    return pauses
+
+
+def split_indices(metrics: SegmentMetrics, mode: str, value: float, stop_speed: float = 0.5) -> list[int]:
+    """
+    Indices where a new part starts (never 0): at the end of every pause ("pause", value = minimum
+    pause in seconds), or every `value` meters ("distance") or seconds ("time") from the start.
+    """
+    n = len(metrics)
+    if value <= 0:
+        raise ValueError("Split value must be positive")
+
+    if mode == "pause":
+        out = [last for _, last in detect_pauses(metrics, value, stop_speed)]
+    elif mode == "distance":
+        cum = metrics.cumulative_distance()
+        out = [bisect_left(cum, k * value) for k in range(1, int(cum[-1] // value) + 1)] if n else []
+    elif mode == "time":
+        if metrics.unordered:
+            raise ValueError("Split by time needs ordered timestamps")
+        times = metrics.times
+        out = [bisect_left(times, times[0] + k * value)
+               for k in range(1, int((times[-1] - times[0]) // value) + 1)] if n else []
+    else:
+        raise ValueError(f"Unknown split mode: {mode}")
+
+    return sorted({i for i in out if 0 < i < n})
@@ -1,8 +1,8 @@
 import xmltodict
 
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from backend.models.track import Track, TrackSegment, TrackPoint, TrackMetadata
+from backend.models.track import Track, TrackSegment, TrackPoint, TrackMetadata, Lap
 
 def load_tcx(content: bytes) -> Track:
     data = xmltodict.parse(content)
@@ -30,12 +30,30 @@ def load_tcx(content: bytes) -> Track:
     if start_time:
         metadata["start_time"] = start_time
 
-    for lap in activity.get("Lap", []):
+    laps = []
+    lap_items = activity.get("Lap", [])
+    # xmltodict gives a dict instead of a list for a single element
+    if isinstance(lap_items, dict):
+        lap_items = [lap_items]
+
+    for lap in lap_items:
+        if "@StartTime" in lap and "TotalTimeSeconds" in lap:
+            lap_start = datetime.fromisoformat(lap["@StartTime"].replace("Z", "+00:00"))
+            laps.append(Lap(
+                start_time=lap_start,
+                end_time=lap_start + timedelta(seconds=float(lap["TotalTimeSeconds"])),
+                trigger=lap.get("TriggerMethod", "").lower() or None,
+            ))
+
         if "Track" not in lap:
             continue
 
+        trackpoints = lap["Track"]["Trackpoint"]
+        if isinstance(trackpoints, dict):
+            trackpoints = [trackpoints]
+
         pts = []
-        for tp in lap["Track"]["Trackpoint"]:
+        for tp in trackpoints:
             lat = tp.get("Position", {}).get("LatitudeDegrees")
             lon = tp.get("Position", {}).get("LongitudeDegrees")
             ele = tp.get("AltitudeMeters")
@@ -73,4 +91,4 @@ def load_tcx(content: bytes) -> Track:
         segments.append(TrackSegment(points=pts))
 
 
-    return Track(segments=segments, metadata=metadata)
\ No newline at end of file
+    return Track(segments=segments, metadata=metadata, laps=laps)
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""
+Differences between two states of a track (original vs edited), aligned by point id.
+
+Thanks to the copy-on-write sharing in TrackSession, a point list or point object that
+is the same in both states is unchanged and is skipped without looking at its fields;
+only the copied parts are compared.
+"""
+from haversine import haversine, Unit
+
+from backend.models.track import Track, TrackPoint
+
+ATTRS = ("ele", "hr", "cadence", "power")
+
+
+def _point_change(old: TrackPoint, new: TrackPoint) -> tuple[float, float | None] | None:
+    """(displacement m, time shift s) or None if the point is unchanged."""
+    moved = old.lat != new.lat or old.lon != new.lon
+    retimed = old.time != new.time
+    if not (moved or retimed or any(getattr(old, a) != getattr(new, a) for a in ATTRS)):
+        return None
+    displacement = haversine((old.lat, old.lon), (new.lat, new.lon), unit=Unit.METERS) if moved else 0.0
+    shift = (new.time - old.time).total_seconds() if retimed and old.time and new.time else None
+    return displacement, shift if retimed else 0.0
+
+
+class _Range:
+    """A run of consecutive points with the same kind of change, with its aggregates."""
+    def __init__(self, kind: str, segment_idx: int, start: int):
+        self.kind = kind
+        self.segment_idx = segment_idx
+        self.start = self.end = start
+        self.moved = 0
+        self.displacement_sum = 0.0
+        self.displacement_max = 0.0
+        self.shift_min: float | None = None
+        self.shift_max: float | None = None
+
+    def add(self, idx: int, change: tuple[float, float | None] | None = None):
+        self.end = idx
+        if change is None:
+            return
+        displacement, shift = change
+        if displacement > 0:
+            self.moved += 1
+            self.displacement_sum += displacement
+            self.displacement_max = max(self.displacement_max, displacement)
+        if shift:
+            self.shift_min = shift if self.shift_min is None else min(self.shift_min, shift)
+            self.shift_max = shift if self.shift_max is None else max(self.shift_max, shift)
+
+    def to_dict(self) -> dict:
+        out = {"kind": self.kind, "segment_idx": self.segment_idx, "start": self.start, "end": self.end,
+               "points": self.end - self.start + 1}
+        if self.kind == "modified":
+            out.update({
+                "moved": self.moved,
+                "max_displacement": self.displacement_max,
+                "mean_displacement": self.displacement_sum / self.moved if self.moved else 0.0,
+                "min_time_shift": self.shift_min,
+                "max_time_shift": self.shift_max,
+            })
+        return out
+
+
+def diff_tracks(original: Track, current: Track) -> dict:
+    """
+    Change map from `original` to `current`: ranges of modified and added points (indices in
+    `current`) and of removed points (indices in `original`), plus point counts.
+    """
+    shared = {id(seg.points) for seg in original.segments} & {id(seg.points) for seg in current.segments}
+
+    # original points whose list is not shared, by id
+    remaining: dict[str, tuple[int, int, TrackPoint]] = {}
+    for seg_idx, seg in enumerate(original.segments):
+        if id(seg.points) not in shared:
+            for idx, p in enumerate(seg.points):
+                remaining[p.id] = (seg_idx, idx, p)
+
+    ranges: list[_Range] = []
+    counts = {"unchanged": 0, "modified": 0, "moved": 0, "retimed": 0, "added": 0, "removed": 0}
+    for seg_idx, seg in enumerate(current.segments):
+        if id(seg.points) in shared:
+            counts["unchanged"] += len(seg.points)
+            continue
+        run: _Range | None = None
+        for idx, p in enumerate(seg.points):
+            found = remaining.pop(p.id, None)
+            if found is None:
+                kind, change = "added", None
+            elif found[2] is p or (change := _point_change(found[2], p)) is None:
+                counts["unchanged"] += 1
+                run = None
+                continue
+            else:
+                kind = "modified"
+                counts["moved"] += change[0] > 0
+                counts["retimed"] += change[1] != 0
+            counts[kind] += 1
+            if run is None or run.kind != kind or run.end != idx - 1:
+                run = _Range(kind, seg_idx, idx)
+                ranges.append(run)
+            run.add(idx, change)
+
+    # what is left of the original was removed
+    removed: list[_Range] = []
+    for seg_idx, idx, _ in sorted(remaining.values(), key=lambda r: (r[0], r[1])):
+        if removed and removed[-1].segment_idx == seg_idx and removed[-1].end == idx - 1:
+            removed[-1].add(idx)
+        else:
+            removed.append(_Range("removed", seg_idx, idx))
+    counts["removed"] = len(remaining)
+
+    return {"counts": counts, "ranges": [r.to_dict() for r in ranges + removed]}
@@ -1,11 +1,23 @@
+import importlib
+
 from typing import Literal
 
 from fastapi import UploadFile
 
 from backend.models.track import Track
-from backend.services.gpx import load_gpx, to_gpx
-from backend.services.fit import load_fit
-from backend.services.tcx import load_tcx
+from backend.services.instrumentation import span
+
+# Parsers by extension as (module, function). A format's module and its parser library
+# (gpxpy, fitdecode, xmltodict) are imported on the first file of that format.
+PARSERS = {
+    ".gpx": ("backend.services.gpx", "load_gpx"),
+    ".fit": ("backend.services.fit", "load_fit"),
+    ".tcx": ("backend.services.tcx", "load_tcx"),
+}
+SUPPORTED_EXTENSIONS = tuple(PARSERS)
+
+def _function(module: str, name: str):
+    return getattr(importlib.import_module(module), name)
 
 # Main dispatcher
 async def load_track(file: UploadFile) -> Track:
@@ -14,23 +26,32 @@ async def load_track(file: UploadFile) -> Track:
     Returns a Track object.
     """
     content = await file.read()
-    filename = file.filename.lower()
-
-    if filename.endswith(".gpx"):
-        return load_gpx(content)
-    elif filename.endswith(".fit"):
-        return load_fit(content)
-    elif filename.endswith(".tcx"):
-        return load_tcx(content)
-    else:
+    return parse_track(content, file.filename)
+
+def parse_track(content: bytes, filename: str) -> Track:
+    """
+    Parses raw file content, the format is detected by the filename extension.
+    Used by load_track() and by the batch mode, which works without the web server.
+    """
+    filename = filename.lower()
+    ext = next((ext for ext in PARSERS if filename.endswith(ext)), None)
+    if ext is None:
         raise ValueError("Unsupported format: " + filename)
+    loader = _function(*PARSERS[ext])
+
+    with span("parse"):
+        return loader(content)
 
 async def export_track(track: Track, fmt: Literal["gpx", "fit", "tcx"]="gpx") -> dict:
+    return render_track(track, fmt)
+
+def render_track(track: Track, fmt: Literal["gpx", "fit", "tcx"]="gpx") -> dict:
+    """Serializes a track into the given format: {"data": ..., "media_type": ...}."""
     if fmt == "gpx":
-        return {"data": to_gpx(track), "media_type": "application/gpx+xml"}
+        to_gpx = _function("backend.services.gpx", "to_gpx")
+        with span("export.gpx"):
+            return {"data": to_gpx(track), "media_type": "application/gpx+xml"}
     elif fmt == "fit":
         pass
     else:
         pass
-
-
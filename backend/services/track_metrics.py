@@ -0,0 +1,466 @@
+"""
+Derived track metrics (distance, moving time, elevation gain/loss, speed, HR/power)
+kept up to date incrementally: an edit only recomputes the steps of the touched points.
+The same per-point arrays hold the epoch seconds of the points, used as a time index.
+"""
+import copy
+import math
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from itertools import accumulate
+
+from haversine import haversine, Unit
+
+from backend.models.track import Track, TrackPoint
+
+MOVING_SPEED = 0.5 # m/s, slower steps count as a stop
+EARTH_R = 6371008.8 # meters, as used by haversine
+CHANNELS = ("hr", "cadence", "power")
+NAN = math.nan
+
+
+def _num(value) -> float:
+    return NAN if value is None else float(value)
+
+
+def epoch(t: datetime | None) -> float:
+    """Epoch seconds of a point time, naive times are taken as UTC. NaN if unknown."""
+    if t is None:
+        return NAN
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return t.timestamp()
+
+
+class SegmentMetrics:
+    """
+    Per-step arrays of one segment: step i goes from point i-1 to point i (step 0 is empty).
+    Totals are running sums, so updating a range costs O(range).
+    """
+    def __init__(self, points: list[TrackPoint]):
+        n = len(points)
+        self.dist = array("d", bytes(8 * n)) # meters
+        self.dt = array("d", bytes(8 * n))   # seconds, 0 if unknown
+        self.dele = array("d", bytes(8 * n)) # meters
+        self.channels = {ch: array("d", [NAN]) * n for ch in CHANNELS}
+        self.times = array("d", [NAN]) * n   # epoch seconds per point
+        self.backwards = bytearray(n)        # 1 if step i goes back in time or a time is missing
+
+        self.distance = 0.0
+        self.duration = 0.0
+        self.moving_distance = 0.0
+        self.moving_time = 0.0
+        self.gain = 0.0
+        self.loss = 0.0
+        self.channel_sum = {ch: 0.0 for ch in CHANNELS}
+        self.channel_count = {ch: 0 for ch in CHANNELS}
+        self.unordered = 0 # number of backwards steps, the time index needs 0
+
+        self._cum_dist: array | None = None
+        self._cum_valid = 0 # prefix sums are valid up to this index
+        # maxima of the step speeds and of the channels, raised as values come in; a key is
+        # stale (rescanned on demand) only when the value holding its max was lowered
+        self._max: dict[str, float | None] = dict.fromkeys(("speed", *CHANNELS))
+        self._max_stale: set[str] = set()
+
+        self.update(points, 0, n - 1)
+
+    def __len__(self):
+        return len(self.dist)
+
+    def copy(self) -> "SegmentMetrics":
+        other = copy.copy(self)
+        other.dist = self.dist[:]
+        other.dt = self.dt[:]
+        other.dele = self.dele[:]
+        other.channels = {ch: a[:] for ch, a in self.channels.items()}
+        other.times = self.times[:]
+        other.backwards = self.backwards[:]
+        other.channel_sum = dict(self.channel_sum)
+        other.channel_count = dict(self.channel_count)
+        other._cum_dist = self._cum_dist[:] if self._cum_dist is not None else None
+        other._max = dict(self._max)
+        other._max_stale = set(self._max_stale)
+        return other
+
+    # ---------- step contributions ----------
+    def _apply_step(self, i: int, sign: int):
+        d, dt, de = self.dist[i], self.dt[i], self.dele[i]
+        self.unordered += sign * self.backwards[i]
+        self.distance += sign * d
+        self.duration += sign * dt
+        if dt <= 0 or d / dt >= MOVING_SPEED:
+            self.moving_distance += sign * d
+            self.moving_time += sign * dt
+        if de > 0:
+            self.gain += sign * de
+        else:
+            self.loss -= sign * de
+
+    def _apply_point(self, i: int, sign: int):
+        for ch in CHANNELS:
+            v = self.channels[ch][i]
+            if v == v: # not NaN
+                self.channel_sum[ch] += sign * v
+                self.channel_count[ch] += sign
+
+    def _speed(self, i: int) -> float:
+        dt = self.dt[i]
+        return self.dist[i] / dt if dt > 0 else NAN
+
+    def _replace_max(self, key: str, old: float, new: float):
+        """A value of `key` changed from old to new (NaN if none)."""
+        m = self._max[key]
+        if new == new and (m is None or new > m):
+            self._max[key] = new
+        elif old == m and not new >= m:
+            self._max_stale.add(key)
+
+    def _compute_step(self, points: list[TrackPoint], i: int):
+        if i == 0:
+            self.dist[0] = self.dt[0] = self.dele[0] = 0.0
+            self.backwards[0] = self.times[0] != self.times[0]
+            return
+        a, b = points[i - 1], points[i]
+        self.dist[i] = haversine((a.lat, a.lon), (b.lat, b.lon), unit=Unit.METERS)
+        dt = self.times[i] - self.times[i - 1]
+        self.dt[i] = dt if dt == dt else 0.0
+        self.backwards[i] = not dt >= 0 # also set for NaN
+        self.dele[i] = b.ele - a.ele if a.ele is not None and b.ele is not None else 0.0
+
+    # ---------- updates ----------
+    def update(self, points: list[TrackPoint], start: int, end: int):
+        """Points start..end (inclusive) changed: recomputes their steps and the next one."""
+        n = len(points)
+        if n == 0:
+            return
+        start = max(0, start)
+        end = min(n - 1, end)
+        step_end = min(n - 1, end + 1)
+
+        for i in range(start, end + 1):
+            self._apply_point(i, -1)
+            for ch in CHANNELS:
+                values = self.channels[ch]
+                old, values[i] = values[i], _num(getattr(points[i], ch))
+                self._replace_max(ch, old, values[i])
+            self.times[i] = epoch(points[i].time)
+            self._apply_point(i, +1)
+
+        for i in range(start, step_end + 1):
+            self._apply_step(i, -1)
+            old = self._speed(i)
+            self._compute_step(points, i)
+            self._replace_max("speed", old, self._speed(i))
+            self._apply_step(i, +1)
+
+        self._cum_valid = min(self._cum_valid, start)
+
+    def update_positions(self, points: list[TrackPoint], start: int, end: int):
+        """
+        Only the positions of points start..end (inclusive) changed: recomputes the
+        distances of their steps and the next one, leaving times and elevations alone.
+        The haversine formula is inlined, so each point is converted to radians once.
+        """
+        n = len(points)
+        start = max(1, start)
+        step_end = min(n - 1, end + 1)
+        if start > step_end:
+            return
+        dist, dts = self.dist, self.dt
+        radians, sin, cos, asin, sqrt = math.radians, math.sin, math.cos, math.asin, math.sqrt
+        distance = moving_distance = moving_time = 0.0
+        a = points[start - 1]
+        lat0, lon0 = radians(a.lat), radians(a.lon)
+        cos0 = cos(lat0)
+        for i in range(start, step_end + 1):
+            b = points[i]
+            lat1, lon1 = radians(b.lat), radians(b.lon)
+            cos1 = cos(lat1)
+            h = sin((lat1 - lat0) * 0.5) ** 2 + cos0 * cos1 * sin((lon1 - lon0) * 0.5) ** 2
+            old, new = dist[i], EARTH_R * (2 * asin(sqrt(h)))
+            dist[i] = new
+            dt = dts[i]
+            if dt > 0:
+                self._replace_max("speed", old / dt, new / dt)
+            distance += new - old
+            if dt <= 0 or old / dt >= MOVING_SPEED:
+                moving_distance -= old
+                moving_time -= dt
+            if dt <= 0 or new / dt >= MOVING_SPEED:
+                moving_distance += new
+                moving_time += dt
+            lat0, lon0, cos0 = lat1, lon1, cos1
+        self.distance += distance
+        self.moving_distance += moving_distance
+        self.moving_time += moving_time
+        self._cum_valid = min(self._cum_valid, start)
+
+    def update_elevation(self, points: list[TrackPoint], start: int, end: int):
+        """
+        Only the elevations of points start..end (inclusive) changed: recomputes the
+        elevation deltas of their steps and the next one, leaving distances and times alone.
+        """
+        n = len(points)
+        start = max(1, start)
+        step_end = min(n - 1, end + 1)
+        dele = self.dele
+        gain = loss = 0.0
+        for i in range(start, step_end + 1):
+            old = dele[i]
+            a, b = points[i - 1].ele, points[i].ele
+            new = dele[i] = b - a if a is not None and b is not None else 0.0
+            if old > 0:
+                gain -= old
+            else:
+                loss += old
+            if new > 0:
+                gain += new
+            else:
+                loss -= new
+        self.gain += gain
+        self.loss += loss
+
+    def insert(self, points: list[TrackPoint], idx: int, count: int = 1):
+        """`count` points were inserted at `idx`."""
+        zeros = array("d", bytes(8 * count))
+        for arr in (self.dist, self.dt, self.dele):
+            arr[idx:idx] = zeros
+        for ch in CHANNELS:
+            self.channels[ch][idx:idx] = array("d", [NAN]) * count
+        self.times[idx:idx] = array("d", [NAN]) * count
+        self.backwards[idx:idx] = bytes(count)
+        self.update(points, idx, idx + count - 1)
+
+    # ---------- queries ----------
+    def cumulative_distance(self) -> array:
+        """Prefix sums of the step distances, extended lazily from the first stale index."""
+        n = len(self.dist)
+        if self._cum_dist is None or len(self._cum_dist) != n:
+            self._cum_dist = array("d", bytes(8 * n))
+            self._cum_valid = 0
+        if self._cum_valid < n:
+            start = self._cum_valid
+            base = self._cum_dist[start - 1] if start > 0 else 0.0
+            self._cum_dist[start:] = array("d", accumulate(self.dist[start:], initial=base))[1:]
+            self._cum_valid = n
+        return self._cum_dist
+
+    def time_range(self, t0: float, t1: float) -> tuple[int, int] | None:
+        """
+        First and last index of the points with t0 <= time <= t1 (epoch seconds), None if there are none.
+        O(log N) by bisection while the times are ordered, a linear scan otherwise.
+        """
+        times = self.times
+        if self.unordered == 0:
+            lo = bisect_left(times, t0)
+            hi = bisect_right(times, t1) - 1
+        else:
+            inside = [i for i, t in enumerate(times) if t0 <= t <= t1]
+            lo, hi = (inside[0], inside[-1]) if inside else (0, -1)
+        return (lo, hi) if lo <= hi else None
+
+    def nearest_time(self, t: float) -> int | None:
+        """Index of the point closest in time to t (epoch seconds), None if no point has a time."""
+        times = self.times
+        if self.unordered == 0:
+            if not times:
+                return None
+            i = bisect_left(times, t)
+            if i == len(times) or (i > 0 and t - times[i - 1] <= times[i] - t):
+                return i - 1
+            return i
+        timed = [(abs(v - t), i) for i, v in enumerate(times) if v == v]
+        return min(timed)[1] if timed else None
+
+    def range_totals(self, i: int, j: int) -> dict:
+        """Additive totals of points i..j (inclusive): steps i+1..j and the channels of the points."""
+        out = dict.fromkeys(("distance", "moving_distance", "duration", "moving_time",
+                             "elevation_gain", "elevation_loss", "max_speed"), 0.0)
+        out["points"] = j - i + 1
+        out["max_speed"] = None
+        for k in range(i + 1, j + 1):
+            d, dt, de = self.dist[k], self.dt[k], self.dele[k]
+            out["distance"] += d
+            out["duration"] += dt
+            if dt <= 0 or d / dt >= MOVING_SPEED:
+                out["moving_distance"] += d
+                out["moving_time"] += dt
+            if dt > 0 and (out["max_speed"] is None or d / dt > out["max_speed"]):
+                out["max_speed"] = d / dt
+            if de > 0:
+                out["elevation_gain"] += de
+            else:
+                out["elevation_loss"] -= de
+        for ch in CHANNELS:
+            values = [v for v in self.channels[ch][i:j + 1] if v == v]
+            out[f"sum_{ch}"] = sum(values)
+            out[f"count_{ch}"] = len(values)
+            out[f"max_{ch}"] = max(values, default=None)
+        return out
+
+    def _maxima(self) -> dict:
+        for key in self._max_stale:
+            if key == "speed":
+                values = [d / t for d, t in zip(self.dist, self.dt) if t > 0]
+            else:
+                values = [v for v in self.channels[key] if v == v]
+            self._max[key] = max(values, default=None)
+        self._max_stale.clear()
+        return self._max
+
+    def summary(self) -> dict:
+        maxima = self._maxima()
+        out = {
+            "points": len(self),
+            "distance": self.distance,
+            "moving_distance": self.moving_distance,
+            "duration": self.duration,
+            "moving_time": self.moving_time,
+            "elevation_gain": self.gain,
+            "elevation_loss": self.loss,
+            "avg_speed": self.moving_distance / self.moving_time if self.moving_time > 0 else None,
+            "max_speed": maxima["speed"],
+        }
+        for ch in CHANNELS:
+            count = self.channel_count[ch]
+            out[f"avg_{ch}"] = self.channel_sum[ch] / count if count else None
+            out[f"max_{ch}"] = maxima[ch]
+        return out
+
+
+class TrackMetrics:
+    """
+    Metrics of a whole track: one SegmentMetrics per segment plus track totals.
+    SegmentMetrics are cached by point list, so restoring a history state whose
+    lists are shared (see TrackSession) reuses them instead of recomputing.
+    """
+    def __init__(self, track: Track):
+        self._by_list: dict[int, tuple[list, SegmentMetrics]] = {}
+        self.rebuild(track)
+
+    def _for_list(self, points: list[TrackPoint], like: list[TrackPoint] | None = None) -> SegmentMetrics:
+        """
+        Metrics of a point list, computed on first use. If `like` is a list of the same length
+        with cached metrics (the same segment in another state), they are copied and only the
+        points that are different objects are recomputed.
+        """
+        entry = self._by_list.get(id(points))
+        if entry is None:
+            base = self._by_list.get(id(like)) if like is not None and len(like) == len(points) else None
+            if base is None:
+                metrics = SegmentMetrics(points)
+            else:
+                metrics = base[1].copy()
+                changed = [i for i, (a, b) in enumerate(zip(base[0], points)) if a is not b]
+                if changed:
+                    metrics.update(points, changed[0], changed[-1])
+            entry = self._by_list[id(points)] = (points, metrics)
+        return entry[1]
+
+    def rebuild(self, track: Track, previous: Track | None = None):
+        """Metrics of a new state of the track; `previous` is the state it replaces."""
+        before = previous.segments if previous is not None else []
+        self.segments = [
+            self._for_list(seg.points, before[i].points if i < len(before) else None)
+            for i, seg in enumerate(track.segments)
+        ]
+
+    def extend(self, track: Track, count: int):
+        """The last `count` segments of the track are new."""
+        for seg in track.segments[len(track.segments) - count:]:
+            self.segments.append(self._for_list(seg.points))
+
+    def fork(self, segment_idx: int, points: list[TrackPoint]):
+        """The segment got a private copy of its point list: its metrics are copied along."""
+        metrics = self.segments[segment_idx].copy()
+        self._by_list[id(points)] = (points, metrics)
+        self.segments[segment_idx] = metrics
+
+    def prune(self, live: set[int]):
+        """Forgets the metrics of point lists not in `live` (ids)."""
+        for key in [k for k in self._by_list if k not in live]:
+            del self._by_list[key]
+
+    def totals_of(self, track: Track) -> dict:
+        """Totals of another state of the track, reusing the cached metrics of shared point lists."""
+        segs = [self._for_list(seg.points) for seg in track.segments]
+        return {
+            "points": sum(len(s) for s in segs),
+            "distance": sum(s.distance for s in segs),
+            "moving_distance": sum(s.moving_distance for s in segs),
+            "duration": sum(s.duration for s in segs),
+            "moving_time": sum(s.moving_time for s in segs),
+            "elevation_gain": sum(s.gain for s in segs),
+            "elevation_loss": sum(s.loss for s in segs),
+        }
+
+    def update(self, track: Track, segment_idx: int, start: int, end: int):
+        self.segments[segment_idx].update(track.segments[segment_idx].points, start, end)
+
+    def update_positions(self, track: Track, segment_idx: int, start: int, end: int):
+        self.segments[segment_idx].update_positions(track.segments[segment_idx].points, start, end)
+
+    def update_elevation(self, track: Track, segment_idx: int, start: int, end: int):
+        self.segments[segment_idx].update_elevation(track.segments[segment_idx].points, start, end)
+
+    def insert(self, track: Track, segment_idx: int, idx: int, count: int = 1):
+        self.segments[segment_idx].insert(track.segments[segment_idx].points, idx, count)
+
+    def avg_speed(self, segment_idx: int | None = None) -> float | None:
+        """Average moving speed of a segment, or of the track if segment_idx is None."""
+        segs = self.segments if segment_idx is None else [self.segments[segment_idx]]
+        dist = sum(s.moving_distance for s in segs)
+        time = sum(s.moving_time for s in segs)
+        return dist / time if time > 0 else None
+
+    def time_range(self, t0: float, t1: float) -> list[tuple[int, int, int]]:
+        """(segment_idx, first, last) of every segment with points in t0..t1 (epoch seconds)."""
+        out = []
+        for seg_idx, seg in enumerate(self.segments):
+            found = seg.time_range(t0, t1)
+            if found:
+                out.append((seg_idx, *found))
+        return out
+
+    def nearest_time(self, t: float) -> tuple[int, int] | None:
+        """(segment_idx, point_idx) of the point closest in time to t (epoch seconds)."""
+        best, best_d = None, math.inf
+        for seg_idx, seg in enumerate(self.segments):
+            i = seg.nearest_time(t)
+            if i is not None and abs(seg.times[i] - t) < best_d:
+                best, best_d = (seg_idx, i), abs(seg.times[i] - t)
+        return best
+
+    def range_summary(self, ranges: list[tuple[int, int, int]]) -> dict:
+        """Summary of the points in (segment_idx, first, last) ranges, e.g. of a lap."""
+        parts = [self.segments[seg_idx].range_totals(i, j) for seg_idx, i, j in ranges]
+        out = {
+            key: sum(p[key] for p in parts)
+            for key in ("points", "distance", "moving_distance", "duration",
+                        "moving_time", "elevation_gain", "elevation_loss")
+        }
+        out["avg_speed"] = out["moving_distance"] / out["moving_time"] if out["moving_time"] > 0 else None
+        out["max_speed"] = max((p["max_speed"] for p in parts if p["max_speed"] is not None), default=None)
+        for ch in CHANNELS:
+            count = sum(p[f"count_{ch}"] for p in parts)
+            out[f"avg_{ch}"] = sum(p[f"sum_{ch}"] for p in parts) / count if count else None
+            out[f"max_{ch}"] = max((p[f"max_{ch}"] for p in parts if p[f"max_{ch}"] is not None), default=None)
+        return out
+
+    def summary(self) -> dict:
+        segments = [s.summary() for s in self.segments]
+        total = {
+            key: sum(s[key] for s in segments)
+            for key in ("points", "distance", "moving_distance", "duration",
+                        "moving_time", "elevation_gain", "elevation_loss")
+        }
+        total["avg_speed"] = self.avg_speed()
+        total["max_speed"] = max((s["max_speed"] for s in segments if s["max_speed"] is not None), default=None)
+        for ch in CHANNELS:
+            count = sum(s.channel_count[ch] for s in self.segments)
+            total[f"avg_{ch}"] = sum(s.channel_sum[ch] for s in self.segments) / count if count else None
+            total[f"max_{ch}"] = max((s[f"max_{ch}"] for s in segments if s[f"max_{ch}"] is not None), default=None)
+        return {"total": total, "segments": segments}
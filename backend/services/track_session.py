@@ -1,72 +1,298 @@
+import asyncio
 import copy
+import functools
+import logging
+import math
+import sys
 import uuid
 
 from datetime import timedelta, datetime
-from typing import List
+from itertools import islice
+from typing import List, Callable
 from haversine import haversine, Unit
-from backend.models.track import Track, TrackSegment, TrackPoint, GpsStuck
+from backend.models.track import Track, TrackSegment, TrackPoint, GpsStuck, GpsOutliers, Lap
+from backend.services.instrumentation import timed, span
+from backend import config
+from backend.services import session_memory, elevation, road_graph, filtering, splitting, simplify, track_diff
+from backend.services.track_metrics import TrackMetrics, epoch
+
+logger = logging.getLogger(__name__)
 
 
 class TrackSession:
     """
     Manages track editing and stores the change history for undo().
+
+    The original, current and history tracks share their point lists and points
+    (copy-on-write): a snapshot only copies the segment headers, and an edit copies
+    just the list and the points it modifies, through _mutable_points()/_mutable_point().
+    The session takes over the given track, it must not be modified afterwards.
     """
     def __init__(self, track: Track):
         # The original track (not to be changed)
-        self.original_track = copy.deepcopy(track)
+        self.original_track = _snapshot(track)
 
         # Current state
-        self.current_track = copy.deepcopy(track)
+        self.current_track = _snapshot(track)
 
         # Previous states
         self._history: List[Track] = []
 
         # Current index of the history list
         self._history_idx: int = -1
+
+        # Points copied on write while editing on top of each history state: the old
+        # versions stay alive in history only (counted for /metrics, kept in step with _history)
+        self._history_copies: List[int] = []
+
+        # Point lists and points the current track owns (not shared with any snapshot yet), by id()
+        self._owned_lists: set[int] = set()
+        self._owned_points: set[int] = set()
+
+        # Derived metrics of the current track, updated incrementally
+        self.metrics = TrackMetrics(self.current_track)
+
+        # Other analysis results of the current track, dropped on every change (see _cached())
+        self.version = 0
+        self._cache: dict[tuple, object] = {}
+        self.precompute_state = "pending"
         self._save_state()
 
     MAX_HISTORY = 10 # Maximum saved states in history
 
     # Auxiliary methods
+    @timed("history.snapshot")
     def _save_state(self):
         """Saves the current state."""
         # If we are not at the end of history — cut redo states
         if self._history_idx < len(self._history) - 1:
             self._history = self._history[: self._history_idx + 1]
+            self._history_copies = self._history_copies[: self._history_idx + 1]
 
-        # Save current state
-        self._history.append(copy.deepcopy(self.current_track))
+        # Save current state: everything the current track holds becomes shared
+        self._history.append(_snapshot(self.current_track))
+        self._history_copies.append(0)
         self._history_idx += 1
+        self._owned_lists.clear()
+        self._owned_points.clear()
 
         # Enforce history size limit
         if len(self._history) > self.MAX_HISTORY:
             self._history.pop(0)
+            self._history_copies.pop(0)
             self._history_idx -= 1
+        self._prune_derived()
+
+    def _restore(self, track: Track):
+        """Makes a snapshot the current state."""
+        previous = self.current_track
+        self.current_track = _snapshot(track)
+        self._owned_lists.clear()
+        self._owned_points.clear()
+        self._track_replaced(previous)
+        self._prune_derived()
+
+    def _mutable_points(self, segment_idx: int) -> List[TrackPoint]:
+        """The point list of a segment, copied first if a snapshot shares it."""
+        segment = self.current_track.segments[segment_idx]
+        if id(segment.points) not in self._owned_lists:
+            segment.points = list(segment.points)
+            self._owned_lists.add(id(segment.points))
+            self.metrics.fork(segment_idx, segment.points)
+        return segment.points
+
+    def _mutable_point(self, segment_idx: int, idx: int) -> TrackPoint:
+        """A point that can be modified in place, copied first if a snapshot shares it."""
+        pts = self._mutable_points(segment_idx)
+        p = pts[idx]
+        if id(p) not in self._owned_points:
+            p = pts[idx] = _copy_point(p)
+            self._owned_points.add(id(p))
+            self._history_copies[self._history_idx] += 1
+        return p
+
+    def _mutable_range(self, segment_idx: int, indices) -> List[TrackPoint]:
+        """_mutable_point for many indices at once; returns the segment's point list."""
+        pts = self._mutable_points(segment_idx)
+        owned = self._owned_points
+        copied = len(owned)
+        for i in indices:
+            p = pts[i]
+            if id(p) not in owned:
+                p = pts[i] = _copy_point(p)
+                owned.add(id(p))
+        self._history_copies[self._history_idx] += len(owned) - copied
+        return pts
+
+    def _prune_derived(self):
+        """
+        Drops the metrics of point lists only older history states hold: every edit forks
+        the per-point arrays of its segment, so keeping them all would cost a segment-sized
+        copy per history entry. The state undo restores next keeps its metrics; the others
+        are rebuilt when undo/redo brings them back.
+        """
+        tracks = [self.original_track, self.current_track]
+        if self._history_idx > 0:
+            tracks.append(self._history[self._history_idx - 1])
+        self.metrics.prune({id(seg.points) for t in tracks for seg in t.segments})
 
+    @timed("session.undo")
     def undo(self) -> bool:
         if self._history_idx <= 0:
             return False
 
         self._history_idx -= 1
-        self.current_track = copy.deepcopy(self._history[self._history_idx])
+        self._restore(self._history[self._history_idx])
         return True
 
+    @timed("session.redo")
     def redo(self) -> bool:
         if self._history_idx >= len(self._history) - 1:
             return False
 
         self._history_idx += 1
-        self.current_track = copy.deepcopy(self._history[self._history_idx])
+        self._restore(self._history[self._history_idx])
         return True
 
-    def _route_via_osrm(self, start_point, new_lat, new_lon, end_point) -> List[TrackPoint]:
-        pass
+    # Change notifications: keep the derived data in sync with current_track
+    def _points_changed(self, segment_idx: int, start: int, end: int):
+        """Points start..end (inclusive) of a segment were modified in place."""
+        self.metrics.update(self.current_track, segment_idx, start, end)
+        self._invalidate()
+
+    def _positions_changed(self, segment_idx: int, start: int, end: int):
+        """Only the positions of points start..end (inclusive) were modified in place."""
+        self.metrics.update_positions(self.current_track, segment_idx, start, end)
+        self._invalidate()
+
+    def _elevation_changed(self, segment_idx: int, start: int, end: int):
+        """Only the elevations of points start..end (inclusive) were modified in place."""
+        self.metrics.update_elevation(self.current_track, segment_idx, start, end)
+        self._invalidate()
+
+    def _points_inserted(self, segment_idx: int, idx: int, count: int = 1):
+        self.metrics.insert(self.current_track, segment_idx, idx, count)
+        self._invalidate()
+
+    def _segments_appended(self, count: int):
+        self.metrics.extend(self.current_track, count)
+        self._invalidate()
+
+    def _track_replaced(self, previous: Track | None = None):
+        """The current track was replaced as a whole (`previous` = the state it replaces, if similar)."""
+        self.metrics.rebuild(self.current_track, previous)
+        self._invalidate()
+
+    def _invalidate(self):
+        self.version += 1
+        self._cache.clear()
+
+    def _cached(self, key: tuple, compute):
+        """Result of compute() for the current version of the track, computed once."""
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def precompute_tasks(self) -> list[tuple[str, tuple, Callable[[Track], object], bool]]:
+        """
+        (name, cache key, function of the track, in_worker) of the analyses worth having ready
+        after upload. in_worker functions only read the points of the track they are given,
+        so they can run in a worker thread on a snapshot (see frozen_track()); the others use
+        the incrementally kept metrics and are cheap enough for the event loop.
+        """
+        tasks = [
+            ("metrics", ("metrics",), lambda track: self.metrics.summary(), False),
+            ("distance", ("distance",), lambda track: [m.cumulative_distance() for m in self.metrics.segments], False),
+            ("stucks", ("stucks", config.STUCK_MIN_POINTS),
+             functools.partial(self._stuck_runs, config.STUCK_MIN_POINTS), True),
+        ]
+        for tol in config.LOD_TOLERANCES:
+            tasks.append((f"lod:{tol:g}", ("lod", tol), functools.partial(self._simplify, tol), True))
+        return tasks
+
+    def frozen_track(self) -> Track:
+        """
+        A snapshot of the current track that later edits will not modify in place:
+        the current track stops owning its lists and points, so edits copy them first.
+        """
+        self._owned_lists.clear()
+        self._owned_points.clear()
+        return _snapshot(self.current_track)
+
+    def precompute_status(self) -> dict:
+        """State of the background precomputation and which results are ready for the current version."""
+        return {
+            "state": self.precompute_state,
+            "version": self.version,
+            "ready": {name: key in self._cache for name, key, *_ in self.precompute_tasks()},
+        }
+
+    def _route_on_roads(self, start_point, new_lat, new_lon, end_point) -> tuple[List[TrackPoint], int]:
+        """
+        Road geometry from start_point to the new position and on to end_point
+        over the local road graph. Returns the points between start_point and end_point
+        with time and sensor values interpolated by distance, and the index of the dragged one.
+        """
+        graph = road_graph.road_graph()
+        if graph is None:
+            raise ValueError("Road routing is not configured (FYT_ROAD_GRAPH)")
+
+        drag = (new_lat, new_lon)
+
+        def leg(a: tuple[float, float], b: tuple[float, float]) -> list[tuple[float, float]]:
+            path = graph.route(*a, *b)
+            if path is None:
+                raise ValueError("No road route found")
+            # nodes on top of the leg ends would only add zero-length steps
+            return [node for node in path if node != a and node != b]
+
+        before = leg((start_point.lat, start_point.lon), drag) if start_point else []
+        after = leg(drag, (end_point.lat, end_point.lon)) if end_point else []
+
+        # full geometry: start_point, before..., dragged point, after..., end_point
+        coords = ([(start_point.lat, start_point.lon)] if start_point else []) + before \
+            + [drag] + after + ([(end_point.lat, end_point.lon)] if end_point else [])
+        cum = [0.0]
+        for (lat0, lon0), (lat1, lon1) in zip(coords, coords[1:]):
+            cum.append(cum[-1] + haversine((lat0, lon0), (lat1, lon1), unit=Unit.METERS))
+
+        def make(k: int) -> TrackPoint:
+            lat, lon = coords[k]
+            if start_point and end_point:
+                t = cum[k] / cum[-1] if cum[-1] else 0.0
+                a, b = start_point, end_point
+            else:
+                t, a, b = 0.0, start_point or end_point, start_point or end_point
+            time = a.time + (b.time - a.time) * t if a.time and b.time else None
+            return TrackPoint(
+                lat=lat,
+                lon=lon,
+                ele=_interp(a.ele, b.ele, t),
+                time=time,
+                cadence=_interp_int(a.cadence, b.cadence, t),
+                hr=_interp_int(a.hr, b.hr, t),
+                power=_interp_int(a.power, b.power, t)
+            )
+
+        offset = 1 if start_point else 0
+        return [make(offset + k) for k in range(len(before) + 1 + len(after))], len(before)
 
     # Editing methods
+    @timed("session.detect_gps_stucks")
     def detect_gps_stucks(self, max_speed: float, min_points: int = 10) -> List[GpsStuck]:
         """Detects GPS stucks."""
+        return [
+            stuck for stuck, speed in self._cached(("stucks", min_points), lambda: self._stuck_runs(min_points))
+            if speed > max_speed
+        ]
+
+    def _stuck_runs(self, min_points: int, track: Track | None = None) -> list[tuple[GpsStuck, float]]:
+        """
+        Stuck candidates of at least min_points points, with the speed of the jump ending them.
+        Of the current track, or of `track` (a snapshot of it).
+        """
         stucks = []
-        for seg_idx, segment in enumerate(self.current_track.segments):
+        for seg_idx, segment in enumerate((track or self.current_track).segments):
             pts = segment.points
             i = 1
             while i < len(pts) - 1:
@@ -91,20 +317,21 @@ class TrackSession:
                         unit=Unit.METERS
                     )
                     dt = (pts[i].time - pts[i-1].time).total_seconds()
-                    speed = jump_m / dt
-                    if speed > max_speed:
-                        stucks.append(
-                            GpsStuck(
-                                segment_idx=seg_idx,
-                                start_idx=start,
-                                end_idx=i,
-                                stuck_indices=stuck_indices
-                            )
-                        )
+                    speed = jump_m / dt if dt > 0 else math.inf
+                    stucks.append((
+                        GpsStuck(
+                            segment_idx=seg_idx,
+                            start_idx=start,
+                            end_idx=i,
+                            stuck_indices=stuck_indices
+                        ),
+                        speed
+                    ))
                 else:
                     i += 1
         return stucks
 
+    @timed("session.normalize_gps_stucks")
     def normalize_gps_stucks(self, stucks: list[GpsStuck]):
         """Normalizes the detected GPS stucks by allocating points steadily on a problem part of the track."""
         self._save_state()
@@ -117,21 +344,64 @@ class TrackSession:
 
             for j, idx in enumerate(s.stuck_indices, start=1):
                 t = j / n
-                pts[idx].lat = _interp(p0.lat, p1.lat, t)
-                pts[idx].lon = _interp(p0.lon, p1.lon, t)
+                p = self._mutable_point(s.segment_idx, idx)
+                p.lat = _interp(p0.lat, p1.lat, t)
+                p.lon = _interp(p0.lon, p1.lon, t)
+            self._points_changed(s.segment_idx, s.start_idx, s.end_idx)
+
+    @timed("session.detect_noise")
+    def detect_noise(self, max_speed: float, max_accel: float) -> List[GpsOutliers]:
+        """Detects GPS spikes: points reachable only with an implausible speed or acceleration."""
+        outliers = []
+        for seg_idx, segment in enumerate(self.current_track.segments):
+            indices = filtering.detect_outliers(segment.points, max_speed=max_speed, max_accel=max_accel)
+            if indices:
+                outliers.append(GpsOutliers(segment_idx=seg_idx, indices=indices))
+        return outliers
+
+    @timed("session.filter_noise")
+    def filter_noise(
+            self,
+            outliers: list[GpsOutliers],
+            smooth: bool = True,
+            measurement_noise: float = 5.0,
+            process_noise: float = 1.0,
+    ):
+        """
+        Kalman/RTS smoothing with the outliers ignored as measurements.
+        The outliers are moved onto the smoothed track; with smooth=True every point is.
+        """
+        self._save_state()
+        skip: dict[int, set[int]] = {}
+        for o in outliers:
+            skip.setdefault(o.segment_idx, set()).update(o.indices)
 
+        for seg_idx, segment in enumerate(self.current_track.segments):
+            pts = segment.points
+            seg_skip = skip.get(seg_idx, set())
+            if not pts or (not smooth and not seg_skip):
+                continue
+            lats, lons = filtering.kalman_smooth(
+                pts,
+                skip=seg_skip,
+                measurement_noise=measurement_noise,
+                process_noise=process_noise
+            )
+            targets = range(len(pts)) if smooth else sorted(seg_skip)
+            pts = self._mutable_range(seg_idx, targets)
+            for i in targets:
+                p = pts[i]
+                p.lat, p.lon = lats[i], lons[i]
+            self._positions_changed(seg_idx, min(targets), max(targets))
+
+    @timed("session.insert_point")
     def insert_point(self, segment_idx: int, prev_point_idx: int, lat: float, lon: float):
         """Adds a new point to the track"""
         self._save_state()
         segment = self.current_track.segments[segment_idx]
-        # average speed of the track
-        dist = self.current_track.metadata.get("distance")
-        dur = self.current_track.metadata.get("duration")
-
-        if dist is not None and dur is not None:
-            speed = dist / dur
-        else:
-            speed = 4.0
+        self._mutable_points(segment_idx)
+        # average moving speed of the segment (of the track if the segment has no timing)
+        speed = self.metrics.avg_speed(segment_idx) or self.metrics.avg_speed() or 4.0
 
         # ========== CASE 1 — prepend ==========
         if prev_point_idx == -1:
@@ -151,6 +421,7 @@ class TrackSession:
             )
 
             segment.points.insert(0, new_point)
+            self._points_inserted(segment_idx, 0)
 
         # ========== CASE 2 — append ===========
         elif prev_point_idx == len(segment.points)-1:
@@ -169,6 +440,7 @@ class TrackSession:
             )
 
             segment.points.append(new_point)
+            self._points_inserted(segment_idx, len(segment.points) - 1)
 
         # ==== CASE 3 — inside (interpolate) ====
         else:
@@ -191,7 +463,9 @@ class TrackSession:
             )
 
             segment.points.insert(prev_point_idx+1, new_point)
+            self._points_inserted(segment_idx, prev_point_idx+1)
 
+    @timed("session.update_time")
     def update_time(self, segment_idx: int, point_idx: int, new_time: datetime):
         """Updating the timestamp of a point."""
         segment = self.current_track.segments[segment_idx]
@@ -208,8 +482,10 @@ class TrackSession:
                 f"New time {new_time} is later than next point time {next_point.time}"
             )
         self._save_state()
-        pts[point_idx].time = new_time
+        self._mutable_point(segment_idx, point_idx).time = new_time
+        self._points_changed(segment_idx, point_idx, point_idx)
 
+    @timed("session.reroute")
     def reroute(
             self,
             segment_idx: int,
@@ -218,39 +494,111 @@ class TrackSession:
             new_lon: float,
             mode: str = "straight",
             radius_m: float = 50.0,  # influence radius in meters
-        ):
+        ) -> dict:
         """
         Smooth reroute using distance-based influence (meters).
         Points within radius_m are moved proportionally.
+        mode="road" instead replaces the dragged point by a route over the local road graph
+        from the previous point through the new position to the next one.
+        Returns the changed range like reroute_preview().
         """
+        start, end, new_points = self._reroute_patch(segment_idx, point_idx, new_lat, new_lon, mode, radius_m)
         self._save_state()
-        segment = self.current_track.segments[segment_idx]
-        points = segment.points
+        self._apply_patch(segment_idx, start, end, new_points)
+        return _patch_dict(segment_idx, start, end, new_points)
 
+    @timed("session.reroute_preview")
+    def reroute_preview(
+            self,
+            segment_idx: int,
+            point_idx: int,
+            new_lat: float,
+            new_lon: float,
+            mode: str = "straight",
+            radius_m: float = 50.0,
+            track: Track | None = None,
+    ) -> dict:
+        """
+        What reroute() would do, without changing the session: current points start..end
+        (exclusive) would be replaced by `points`. Used for live dragging; computed on `track`
+        (a frozen_track()) when given, so it can run outside the event loop.
+        """
+        start, end, new_points = self._reroute_patch(
+            segment_idx, point_idx, new_lat, new_lon, mode, radius_m, track
+        )
+        return _patch_dict(segment_idx, start, end, new_points)
+
+    def _reroute_patch(
+            self,
+            segment_idx: int,
+            point_idx: int,
+            new_lat: float,
+            new_lon: float,
+            mode: str,
+            radius_m: float,
+            track: Track | None = None,
+    ) -> tuple[int, int, List[TrackPoint]]:
+        """(start, end, new points) replacing points[start:end]; moved points are copies."""
+        points = (track or self.current_track).segments[segment_idx].points
         center = points[point_idx]
+
+        if mode == "road":
+            prev_point = points[point_idx-1] if point_idx > 0 else None
+            next_point = points[point_idx+1] if point_idx < len(points) - 1 else None
+            routed, center_k = self._route_on_roads(prev_point, new_lat, new_lon, next_point)
+
+            # the dragged point keeps its id and sensor values, the rest of the route is new
+            moved = copy.copy(center)
+            moved.lat, moved.lon, moved.time = new_lat, new_lon, routed[center_k].time
+            return point_idx, point_idx + 1, routed[:center_k] + [moved] + routed[center_k+1:]
+
         old_lat, old_lon = center.lat, center.lon
 
         # index bounds (+/- 100 indices)
         start = max(0, point_idx - 100)
         end = min(len(points), point_idx + 100)
 
-        if mode == "straight":
-            for i in range(start, end):
-                p = points[i]
-                # distance to the dragged point (meters)
-                d = haversine((old_lat, old_lon),(p.lat, p.lon), unit=Unit.METERS)
-                if d > radius_m:
-                    continue  # outside the influence
-
-                weight = 1.0 - (d / radius_m)
-                # smooth shift
-                p.lat += weight * (new_lat - old_lat)
-                p.lon += weight * (new_lon - old_lon)
+        new_points = []
+        for i in range(start, end):
+            p = points[i]
+            # distance to the dragged point (meters)
+            d = haversine((old_lat, old_lon),(p.lat, p.lon), unit=Unit.METERS)
+            if i != point_idx and (mode != "straight" or d > radius_m):
+                new_points.append(p)
+                continue  # outside the influence
+
+            weight = 1.0 - (d / radius_m) if i != point_idx else 1.0
+            # smooth shift
+            p = copy.copy(p)
+            p.lat += weight * (new_lat - old_lat)
+            p.lon += weight * (new_lon - old_lon)
+            new_points.append(p)
 
         # placement of the cental point
+        center = new_points[point_idx - start]
         center.lat = new_lat
         center.lon = new_lon
 
+        # only the moved points make the patch (the dragged one always is a copy)
+        moved = [k for k, p in enumerate(new_points) if p is not points[start + k]]
+        return start + moved[0], start + moved[-1] + 1, new_points[moved[0]:moved[-1] + 1]
+
+    def _apply_patch(self, segment_idx: int, start: int, end: int, new_points: List[TrackPoint]):
+        """Replaces points[start:end] of the current track by new_points (at least as many)."""
+        points = self._mutable_points(segment_idx)
+        old = {id(p) for p in points[start:end]}
+        new = {id(p) for p in new_points}
+        # replaced points a snapshot shares are now held by history only
+        self._history_copies[self._history_idx] += len(old - new - self._owned_points)
+        points[start:end] = new_points
+        self._owned_points.update(new - old)
+
+        added = len(new_points) - (end - start)
+        if added > 0:
+            self._points_inserted(segment_idx, start, added)
+        self._points_changed(segment_idx, start, start + len(new_points) - 1)
+
+    @timed("session.recalculate_times")
     def recalculate_times(
             self,
             start_point_id: str,
@@ -336,9 +684,16 @@ class TrackSession:
             new_times[i] = new_times[i - 1] + timedelta(seconds=dt)
 
         # ---------- 6. Apply ----------
-        for p, t in zip(points, new_times):
-            p.time = t
+        for (seg_idx, pt_idx, _), t in zip(flat[start_idx:end_idx+1], new_times):
+            self._mutable_point(seg_idx, pt_idx).time = t
+
+        ranges: dict[int, list[int]] = {}
+        for seg_idx, pt_idx, _ in flat[start_idx:end_idx+1]:
+            ranges.setdefault(seg_idx, [pt_idx, pt_idx])[1] = pt_idx
+        for seg_idx, (first, last) in ranges.items():
+            self._points_changed(seg_idx, first, last)
 
+    @timed("session.trim")
     def trim(self, start_point_id: str, end_point_id: str):
         """
         Trim track between two point IDs (inclusive).
@@ -374,7 +729,9 @@ class TrackSession:
             raise ValueError("Invalid trim range: no points selected")
 
         self.current_track.segments = new_segments
+        self._track_replaced()
 
+    @timed("session.merge_with")
     def merge_with(self, other: Track):
         """
         Merging tracks.
@@ -385,17 +742,310 @@ class TrackSession:
         self.current_track.segments.extend(
             copy.deepcopy(other.segments)
         )
+        self.current_track.laps.extend(other.laps)
+        self._segments_appended(len(other.segments))
+
+    @timed("session.correct_elevation")
+    def correct_elevation(
+            self,
+            method: str = "median",
+            window: int = 5,
+            polyorder: int = 2,
+            use_dem: bool = False,
+    ):
+        """
+        Cleans the elevation of the whole track as one history step:
+        optional DEM lookup from local tiles, then smoothing ("median", "savgol" or "none").
+        """
+        dem = None
+        if use_dem:
+            dem = elevation.dem_cache()
+            if dem is None:
+                raise ValueError("DEM lookup is not configured (FYT_DEM_DIR)")
+        if method != "none":
+            if method not in elevation.FILTERS:
+                raise ValueError(f"Unknown smoothing method: {method}")
+            if method == "savgol":
+                elevation.savgol_coefficients(window, polyorder) # validates the parameters
+
+        self._save_state()
+        for seg_idx, segment in enumerate(self.current_track.segments):
+            # both passes work on the values, the points are written once at the end
+            old = [p.ele for p in segment.points]
+            values = old
+            if dem:
+                values = [d if d is not None else e for d, e in zip(dem.lookup(segment.points), old)]
+            if method != "none":
+                values = elevation.smooth_values(values, method, window, polyorder)
+            changed = [i for i, ele in enumerate(values) if ele != old[i]]
+            if not changed:
+                continue
+            for i in changed:
+                self._mutable_point(seg_idx, i).ele = values[i]
+            self._elevation_changed(seg_idx, changed[0], changed[-1])
+
+    @timed("session.resample")
+    def resample(
+            self,
+            mode: str | None = None,
+            interval: float | None = None,
+            max_points: int | None = None,
+    ):
+        """
+        Resamples every segment to a uniform time (seconds) or distance (meters) interval.
+        With max_points the interval is widened so the track does not exceed that many points;
+        max_points alone decimates by distance, and does nothing if the track is small enough.
+        """
+        if mode is None and max_points is None:
+            raise ValueError("Either mode with interval or max_points is required")
+        if mode is not None and (interval is None or interval <= 0):
+            raise ValueError("interval must be positive")
+        if mode not in (None, "time", "distance"):
+            raise ValueError(f"Unknown resample mode: {mode}")
+
+        segments = self.current_track.segments
+        seg_metrics = self.metrics.segments
+        if mode is None:
+            mode = "distance"
+
+        # expected size: one point per interval plus the first and last point of each segment
+        spans = [m.duration if mode == "time" else m.distance for m in seg_metrics]
+        if max_points:
+            budget = max_points - 2 * len(segments)
+            if budget < 1:
+                raise ValueError("max_points is too small for the number of segments")
+            # decimation only: a track already within max_points is left as it is
+            if interval is None:
+                count = sum(len(seg.points) for seg in segments)
+            else:
+                count = sum(span / interval + 2 for span in spans)
+            if count > max_points:
+                interval = sum(spans) / budget
+        if not interval:
+            return # nothing to resample (zero length track)
+
+        self._save_state()
+        for seg_idx, segment in enumerate(segments):
+            pts = segment.points
+            if len(pts) < 2:
+                continue
+            if mode == "time":
+                if any(p.time is None for p in pts):
+                    continue
+                t0 = pts[0].time
+                axis = [(p.time - t0).total_seconds() for p in pts]
+            else:
+                axis = seg_metrics[seg_idx].cumulative_distance().tolist()
+            segment.points = _resample_points(pts, axis, interval)
+        self._track_replaced()
+
+    @timed("session.split")
+    def split(
+            self,
+            mode: str,
+            value: float | None = None,
+            stop_speed: float = 0.5,
+            target: str = "segments",
+    ) -> int:
+        """
+        Splits the activity at pauses ("pause", value = minimum pause in seconds, default 60),
+        every `value` meters ("distance") or seconds ("time"), or at the lap markers ("laps").
+        target="segments" cuts the segments, target="laps" replaces the lap markers instead.
+        Returns the number of parts.
+        """
+        if target not in ("segments", "laps"):
+            raise ValueError(f"Unknown split target: {target}")
+        if mode == "laps" and target == "laps":
+            raise ValueError("Laps can only be split into segments")
+        if mode in ("distance", "time") and value is None:
+            raise ValueError(f"Split by {mode} needs a value")
+
+        cuts = []
+        for seg_idx, m in enumerate(self.metrics.segments):
+            if mode == "laps":
+                starts = (m.time_range(epoch(lap.start_time), math.inf) for lap in self.current_track.laps)
+                cuts.append(sorted({found[0] for found in starts if found and found[0] > 0}))
+            else:
+                cuts.append(splitting.split_indices(m, mode, value or 60.0, stop_speed))
+
+        parts = [
+            (seg_idx, a, b)
+            for seg_idx, (segment, seg_cuts) in enumerate(zip(self.current_track.segments, cuts))
+            for a, b in zip([0, *seg_cuts], [*seg_cuts, len(segment.points)])
+            if b > a
+        ]
+
+        self._save_state()
+        segments = self.current_track.segments
+        if target == "segments":
+            self.current_track.segments = [
+                TrackSegment(points=segments[seg_idx].points[a:b]) for seg_idx, a, b in parts
+            ]
+            self._track_replaced()
+        else:
+            # consecutive laps share the boundary point, so their distances add up
+            laps = []
+            for seg_idx, a, b in parts:
+                pts = segments[seg_idx].points
+                end = pts[b] if b < len(pts) else pts[b - 1]
+                if pts[a].time and end.time:
+                    laps.append(Lap(start_time=pts[a].time, end_time=end.time, trigger=mode))
+            self.current_track.laps = laps
+        return len(parts)
+
+    def lap_stats(self) -> list[dict]:
+        """Lap markers with the summary of their points (distance, times, speed, HR/power...)."""
+        return [
+            {
+                **lap.to_dict(),
+                **self.metrics.range_summary(self.metrics.time_range(epoch(lap.start_time), epoch(lap.end_time))),
+            }
+            for lap in self.current_track.laps
+        ]
 
     # Utilities
     def get_track(self) -> Track:
         """Returns the current state of the track."""
         return self.current_track
 
+    def stats(self) -> dict:
+        """Derived metrics of the current track: totals and per segment."""
+        return self._cached(("metrics",), self.metrics.summary)
+
+    def diff(self) -> dict:
+        """
+        What the edits changed: ranges of modified/added/removed points (see track_diff)
+        and the deltas of the totals (current - original).
+        """
+        def compute():
+            before = self.metrics.totals_of(self.original_track)
+            after = self.metrics.totals_of(self.current_track)
+            return {
+                **track_diff.diff_tracks(self.original_track, self.current_track),
+                "delta": {key: after[key] - before[key] for key in after},
+            }
+        return self._cached(("diff",), compute)
+
+    def _simplify(self, tolerance: float, track: Track | None = None) -> list[list[int]]:
+        return [simplify.simplify(seg.points, tolerance) for seg in (track or self.current_track).segments]
+
+    def lod(self, tolerance: float) -> list[dict]:
+        """Simplified geometry (RDP, tolerance in meters) per segment, with the indices of the kept points."""
+        kept = self._cached(("lod", tolerance), functools.partial(self._simplify, tolerance))
+        out = []
+        for seg_idx, (segment, indices) in enumerate(zip(self.current_track.segments, kept)):
+            pts = segment.points
+            out.append({
+                "segment_idx": seg_idx,
+                "indices": indices,
+                "points": [[pts[i].lat, pts[i].lon] for i in indices],
+            })
+        return out
+
+    def summary(self) -> dict:
+        """Metadata and per-segment summaries without the points."""
+        segments = []
+        for seg_idx, (segment, m) in enumerate(zip(self.current_track.segments, self.metrics.segments)):
+            pts = segment.points
+            segments.append({
+                "segment_idx": seg_idx,
+                "points": len(pts),
+                "start_time": pts[0].time if pts else None,
+                "end_time": pts[-1].time if pts else None,
+                "distance": m.distance,
+                "duration": m.duration,
+                "bbox": [
+                    min(p.lat for p in pts), min(p.lon for p in pts),
+                    max(p.lat for p in pts), max(p.lon for p in pts),
+                ] if pts else None,
+            })
+        return {
+            "metadata": dict(self.current_track.metadata),
+            "points": sum(s["points"] for s in segments),
+            "segments": segments,
+        }
+
+    def points_page(self, segment_idx: int, start: int = 0, limit: int = 1000) -> dict:
+        """A page of points of one segment by index range."""
+        pts = self.current_track.segments[segment_idx].points
+        start = max(0, start)
+        page = [p.to_dict() for p in islice(pts, start, start + limit)]
+        end = start + len(page)
+        return {
+            "segment_idx": segment_idx,
+            "start": start,
+            "points": page,
+            "next": end if end < len(pts) else None,
+            "total": len(pts),
+        }
+
+    def points_in_window(
+            self,
+            from_time: datetime,
+            to_time: datetime,
+            limit: int = 1000,
+            segment_idx: int = 0,
+            start: int = 0,
+    ) -> dict:
+        """
+        Points with from_time <= time <= to_time over all segments, at most `limit` of them,
+        from point `start` of segment `segment_idx` on. `next` is the (segment_idx, start)
+        of the following page, None when no points are left.
+        """
+        chunks = []
+        left = limit
+        next_page = None
+        for seg_idx, lo, hi in self.metrics.time_range(epoch(from_time), epoch(to_time)):
+            if seg_idx < segment_idx:
+                continue
+            if seg_idx == segment_idx:
+                lo = max(lo, start)
+                if lo > hi:
+                    continue
+            if left <= 0:
+                next_page = {"segment_idx": seg_idx, "start": lo}
+                break
+            pts = self.current_track.segments[seg_idx].points
+            end = min(hi + 1, lo + left)
+            page = [p.to_dict() for p in islice(pts, lo, end)]
+            left -= len(page)
+            chunks.append({"segment_idx": seg_idx, "start": lo, "points": page})
+            if end <= hi:
+                next_page = {"segment_idx": seg_idx, "start": end}
+                break
+        return {"chunks": chunks, "truncated": next_page is not None, "next": next_page}
+
+    def time_range(self, from_time: datetime, to_time: datetime) -> list[dict]:
+        """Index range (inclusive) of the points with from_time <= time <= to_time, per segment."""
+        return [
+            {"segment_idx": seg_idx, "start": lo, "end": hi}
+            for seg_idx, lo, hi in self.metrics.time_range(epoch(from_time), epoch(to_time))
+        ]
+
+    def point_at_time(self, time: datetime) -> dict | None:
+        """
+        The point closest in time, with `offset` = its time - `time` in seconds.
+        None if no point has a time. Naive times are taken as UTC.
+        """
+        t = epoch(time)
+        found = self.metrics.nearest_time(t)
+        if found is None:
+            return None
+        seg_idx, idx = found
+        return {
+            "segment_idx": seg_idx,
+            "point_idx": idx,
+            "offset": self.metrics.segments[seg_idx].times[idx] - t,
+            "point": self.current_track.segments[seg_idx].points[idx].to_dict(),
+        }
+
+    @timed("session.reset")
     def reset(self):
         """Resets to the original track."""
         self._history_idx = 0
-        self._history = self._history[:1]
-        self.current_track = copy.deepcopy(self._history[self._history_idx])
+        self._history = [_snapshot(self.original_track)]
+        self._history_copies = [0]
+        self._restore(self.original_track)
 
 
 class TrackSessionManager:
@@ -405,6 +1055,7 @@ class TrackSessionManager:
     def __init__(self):
         self.sessions = {}
 
+    @timed("session.create")
     def create_session(self, track):
         session_id = str(uuid.uuid4())
         self.sessions[session_id] = TrackSession(track)
@@ -413,9 +1064,129 @@ class TrackSessionManager:
     def get(self,session_id):
         return self.sessions.get(session_id)
 
+    async def precompute(self, session_id):
+        """
+        Background stage after upload: fills the session caches one analysis at a time.
+        The long ones run in a worker thread on a frozen snapshot of the track, so requests
+        are served meanwhile; a result is only kept if the track did not change in between.
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
+            return
+        session.precompute_state = "running"
+        try:
+            for name, key, compute, in_worker in session.precompute_tasks():
+                await asyncio.sleep(0)
+                if self.sessions.get(session_id) is not session:
+                    return # deleted meanwhile
+                if key in session._cache:
+                    continue
+                with span(f"precompute.{name}"):
+                    if in_worker:
+                        version = session.version
+                        result = await asyncio.to_thread(compute, session.frozen_track())
+                        if session.version == version:
+                            session._cache.setdefault(key, result)
+                    else:
+                        session._cached(key, lambda: compute(session.current_track))
+        except Exception:
+            session.precompute_state = "failed"
+            logger.exception("Precomputation failed for session %s", session_id)
+            return
+        session.precompute_state = "ready"
+
     def delete(self, session_id):
         return self.sessions.pop(session_id, None)
 
+    def memory(self, session_id) -> dict | None:
+        """Estimated memory footprint of one session by component."""
+        session = self.sessions.get(session_id)
+        return session_memory.session_footprint(session) if session else None
+
+    def memory_report(self, top: int = 10) -> dict:
+        """Memory totals over all sessions and the top consumers."""
+        return session_memory.memory_report(self.sessions, top=top)
+
+    def stats(self) -> dict:
+        """Point counts of the live sessions, used by the /metrics collector."""
+        sessions = list(self.sessions.values())
+        history_points = sum(sum(s._history_copies) for s in sessions)
+        return {
+            "sessions": len(sessions),
+            "points": [_count_points(s.current_track) for s in sessions],
+            "history_snapshots": sum(len(s._history) for s in sessions),
+            "history_points": history_points,
+            "history_bytes": history_points * _approx_point_bytes(),
+        }
+
+def _count_points(track: Track) -> int:
+    return sum(len(seg.points) for seg in track.segments)
+
+@functools.cache
+def _approx_point_bytes() -> int:
+    """Rough size of one TrackPoint with all its attributes."""
+    p = TrackPoint(lat=45.0, lon=7.0, ele=100.0, time=datetime.now(), hr=120, cadence=90, power=200)
+    return sys.getsizeof(p) + sys.getsizeof(p.__dict__) + sum(sys.getsizeof(v) for v in vars(p).values())
+
+def _copy_point(p: TrackPoint) -> TrackPoint:
+    """Shallow copy of a point, several times cheaper than copy.copy."""
+    q = object.__new__(TrackPoint)
+    q.__dict__.update(p.__dict__)
+    return q
+
+def _snapshot(track: Track) -> Track:
+    """New Track and TrackSegment objects sharing the point lists (see TrackSession)."""
+    return Track(
+        segments=[TrackSegment(points=seg.points) for seg in track.segments],
+        metadata=dict(track.metadata),
+        laps=list(track.laps)
+    )
+
+def _patch_dict(segment_idx: int, start: int, end: int, new_points: List[TrackPoint]) -> dict:
+    return {
+        "segment_idx": segment_idx,
+        "start": start,
+        "end": end,
+        "points": [p.to_dict() for p in new_points],
+    }
+
 # Linear interpolation
 def _interp(a, b, t):
-    return a + t * (b - a) if a is not None and b is not None else a or b
\ No newline at end of file
+    return a + t * (b - a) if a is not None and b is not None else a or b
+
+def _interp_int(a, b, t):
+    """_interp for the integer channels (hr, cadence, power)."""
+    v = _interp(a, b, t)
+    return round(v) if v is not None else None
+
+def _resample_points(points: List[TrackPoint], axis: List[float], interval: float) -> List[TrackPoint]:
+    """
+    Points at every `interval` along a non-decreasing axis (seconds or meters) plus the last one.
+    Targets falling on an existing point reuse it, the others are interpolated like insert_point().
+    """
+    out = []
+    j = 0
+    n = len(points)
+    target = axis[0]
+    end = axis[-1]
+    while target < end:
+        while j < n - 2 and axis[j + 1] <= target:
+            j += 1
+        a, b = points[j], points[j + 1]
+        span = axis[j + 1] - axis[j]
+        t = (target - axis[j]) / span if span > 0 else 0.0
+        if t == 0.0:
+            out.append(a)
+        else:
+            out.append(TrackPoint(
+                lat=_interp(a.lat, b.lat, t),
+                lon=_interp(a.lon, b.lon, t),
+                ele=_interp(a.ele, b.ele, t),
+                time=a.time + (b.time - a.time) * t if a.time and b.time else a.time or b.time,
+                cadence=_interp_int(a.cadence, b.cadence, t),
+                hr=_interp_int(a.hr, b.hr, t),
+                power=_interp_int(a.power, b.power, t)
+            ))
+        target += interval
+    out.append(points[-1])
+    return out
\ No newline at end of file
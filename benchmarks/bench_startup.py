@@ -0,0 +1,142 @@
+"""
+Cold start benchmark: every run is a fresh interpreter that imports the app,
+serves its first request and parses the first file of each format.
+
+    python -m benchmarks.bench_startup --runs 10 --json startup.json
+    python -m benchmarks.bench_startup --importtime 20
+
+Reported times are medians over the runs, in milliseconds.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from pathlib import Path
+
+from benchmarks.synthetic import make_track, gpx_bytes, tcx_bytes, fit_bytes
+
+PARSER_MODULES = ("gpxpy", "fitdecode", "xmltodict")
+
+# Runs in the child interpreter: argv[1] is the directory with sample.gpx/.fit/.tcx
+PROBE = r"""
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+import backend.main
+t_import = time.perf_counter() - t0
+
+async def first_request():
+    sent = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        sent.append(message)
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/metrics", "raw_path": b"/metrics", "query_string": b"",
+        "root_path": "", "headers": [], "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 8000),
+    }
+    await backend.main.app(scope, receive, send)
+    return sent[0]["status"]
+
+t1 = time.perf_counter()
+status = asyncio.run(first_request())
+t_request = time.perf_counter() - t1
+
+out = {
+    "import_ms": t_import * 1000,
+    "first_request_ms": t_request * 1000,
+    "ready_ms": (time.perf_counter() - t0) * 1000,
+    "status": status,
+    "modules": len(sys.modules),
+    "parsers_loaded": [m for m in %(parsers)r if m in sys.modules],
+}
+from backend.services.track_loader import parse_track
+for ext in ("gpx", "fit", "tcx"):
+    with open(f"{sys.argv[1]}/sample.{ext}", "rb") as f:
+        content = f.read()
+    t2 = time.perf_counter()
+    parse_track(content, f"sample.{ext}")
+    out[f"first_parse_{ext}_ms"] = (time.perf_counter() - t2) * 1000
+print(json.dumps(out))
+""" % {"parsers": PARSER_MODULES}
+
+
+def _samples(directory: Path):
+    track = make_track(100)
+    (directory / "sample.gpx").write_bytes(gpx_bytes(track))
+    (directory / "sample.fit").write_bytes(fit_bytes(track))
+    (directory / "sample.tcx").write_bytes(tcx_bytes(track))
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("FYT_ENV", "production")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(Path.cwd()), env.get("PYTHONPATH")]))
+    return env
+
+
+def probe(sample_dir: Path) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, str(sample_dir)],
+        capture_output=True, text=True, env=_env(), check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_profile(top: int) -> list[tuple[str, int]]:
+    """Modules with the largest cumulative import time (microseconds), from -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.main"],
+        capture_output=True, text=True, env=_env(), check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((name.rstrip(), int(cumulative)))
+    rows.sort(key=lambda r: r[1], reverse=True)
+    return rows[:top]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_startup")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to start")
+    parser.add_argument("--importtime", type=int, metavar="N", help="also list the N slowest imports")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _samples(Path(tmp))
+        runs = [probe(Path(tmp)) for _ in range(args.runs)]
+
+    report = {
+        key: statistics.median(r[key] for r in runs)
+        for key in runs[0] if key.endswith("_ms")
+    }
+    report["modules"] = runs[0]["modules"]
+    report["parsers_loaded_at_startup"] = runs[0]["parsers_loaded"]
+
+    for key, value in report.items():
+        if key.endswith("_ms"):
+            print(f"{key:<22} {value:9.1f} ms")
+        else:
+            print(f"{key:<22} {value}")
+
+    if args.importtime:
+        print()
+        for name, cumulative in import_profile(args.importtime):
+            print(f"{cumulative / 1000:9.1f} ms  {name}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"runs": runs, "median": report}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
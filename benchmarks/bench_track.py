@@ -0,0 +1,219 @@
+"""
+Benchmarks for the parsers, TrackSession edits, history snapshots and serialization.
+
+    python -m benchmarks.bench_track --sizes 1000,10000,100000 --json bench.json
+    python -m benchmarks.bench_track --quick --compare bench.json
+
+Every case is timed on fresh input (setup is not timed), reports ops/sec and
+peak traced memory, and a log-log scaling exponent across the sizes.
+"""
+import argparse
+import json
+import math
+import sys
+import time
+import tracemalloc
+
+from dataclasses import dataclass
+from typing import Callable
+
+from backend.services.fit import load_fit
+from backend.services.gpx import load_gpx, to_gpx
+from backend.services.tcx import load_tcx
+from backend.services.track_session import TrackSession
+from benchmarks.synthetic import make_track, gpx_bytes, tcx_bytes, fit_bytes
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 500_000)
+QUICK_SIZES = (1_000, 10_000)
+
+
+@dataclass
+class Case:
+    name: str
+    setup: Callable[[int], object] # n_points -> state passed to run
+    run: Callable[[object], object]
+
+
+def _session(n: int, stucks: int = 0) -> TrackSession:
+    return TrackSession(make_track(n, stucks=stucks))
+
+def _ids(session: TrackSession, frac0: float, frac1: float) -> tuple[str, str]:
+    pts = session.current_track.segments[0].points
+    return pts[int(len(pts) * frac0)].id, pts[int(len(pts) * frac1) - 1].id
+
+def _mid(session: TrackSession) -> int:
+    return len(session.current_track.segments[0].points) // 2
+
+def _edited_session(n: int) -> TrackSession:
+    s = _session(n)
+    mid = _mid(s)
+    s.reroute(0, mid, 45.0, 7.0, radius_m=50)
+    s.reroute(0, mid + 1, 45.0, 7.0, radius_m=50)
+    return s
+
+def _undone_session(n: int) -> TrackSession:
+    s = _edited_session(n)
+    s.undo()
+    return s
+
+def _stucks_session(n: int):
+    s = _session(n, stucks=max(1, n // 1000))
+    return s, s.detect_gps_stucks(max_speed=30, min_points=10)
+
+def _smoothed_session(n: int) -> TrackSession:
+    """A session whose elevations were all edited, so diff() compares every point."""
+    s = _session(n)
+    s.correct_elevation("median", 5)
+    return s
+
+def _uncached(s: TrackSession) -> TrackSession:
+    """Drops the memoized analyses, so the run computes them."""
+    s._cache.clear()
+    return s
+
+
+CASES: list[Case] = [
+    # ---- parsers / exporters ----
+    Case("load_gpx", lambda n: gpx_bytes(make_track(n)), load_gpx),
+    Case("load_tcx", lambda n: tcx_bytes(make_track(n)), load_tcx),
+    Case("load_fit", lambda n: fit_bytes(make_track(n)), load_fit),
+    Case("to_gpx", make_track, to_gpx),
+    Case("Track.to_dict", make_track, lambda t: t.to_dict()),
+    # ---- session lifecycle / history ----
+    Case("TrackSession()", make_track, TrackSession),
+    Case("_save_state", _session, lambda s: s._save_state()),
+    Case("undo", _edited_session, lambda s: s.undo()),
+    Case("redo", _undone_session, lambda s: s.redo()),
+    Case("reset", _edited_session, lambda s: s.reset()),
+    # ---- edits ----
+    Case("detect_gps_stucks", lambda n: _uncached(_stucks_session(n)[0]),
+         lambda s: s.detect_gps_stucks(max_speed=30, min_points=10)),
+    Case("normalize_gps_stucks", _stucks_session, lambda st: st[0].normalize_gps_stucks(st[1])),
+    Case("insert_point", _session, lambda s: s.insert_point(0, _mid(s), 45.0, 7.0)),
+    Case("update_time", _session,
+         lambda s: s.update_time(0, _mid(s), s.current_track.segments[0].points[_mid(s)].time)),
+    Case("reroute", _session, lambda s: s.reroute(0, _mid(s), 45.0, 7.0, radius_m=50)),
+    Case("detect_noise", _session, lambda s: s.detect_noise(max_speed=30, max_accel=10)),
+    Case("filter_noise", _session, lambda s: s.filter_noise([], smooth=True)),
+    Case("correct_ele(median)", _session, lambda s: s.correct_elevation("median", 5)),
+    Case("correct_ele(savgol)", _session, lambda s: s.correct_elevation("savgol", 7, 2)),
+    Case("resample", _session, lambda s: s.resample(mode="time", interval=5)),
+    Case("split", _session, lambda s: s.split("distance", 1000)),
+    Case("diff", _smoothed_session, lambda s: s.diff()),
+    Case("recalculate_times", _session,
+         lambda s: s.recalculate_times(*_ids(s, 0.1, 0.9), max_deviation=0.1)),
+    Case("trim", _session, lambda s: s.trim(*_ids(s, 0.25, 0.75))),
+    Case("merge_with", lambda n: (_session(n), make_track(n, seed=1)), lambda st: st[0].merge_with(st[1])),
+]
+
+
+def time_case(case: Case, n: int, min_time: float, max_runs: int) -> dict:
+    """Runs the case on fresh state until `min_time` of measured time is spent."""
+    total = 0.0
+    runs = 0
+    while runs < max_runs and (runs == 0 or total < min_time):
+        state = case.setup(n)
+        t0 = time.perf_counter()
+        case.run(state)
+        total += time.perf_counter() - t0
+        runs += 1
+
+    state = case.setup(n)
+    tracemalloc.start()
+    case.run(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    per_op = total / runs
+    return {
+        "case": case.name,
+        "n": n,
+        "runs": runs,
+        "seconds_per_op": per_op,
+        "ops_per_s": 1 / per_op if per_op else math.inf,
+        "peak_mem_bytes": peak,
+    }
+
+
+def scaling_exponent(rows: list[dict]) -> float | None:
+    """Slope of log(time) over log(n) between the smallest and largest size."""
+    rows = sorted(rows, key=lambda r: r["n"])
+    if len(rows) < 2 or rows[0]["seconds_per_op"] <= 0:
+        return None
+    a, b = rows[0], rows[-1]
+    return math.log(b["seconds_per_op"] / a["seconds_per_op"]) / math.log(b["n"] / a["n"])
+
+
+def run(sizes, only: list[str] | None, min_time: float, max_runs: int) -> dict:
+    results = []
+    for case in CASES:
+        if only and case.name not in only:
+            continue
+        rows = []
+        for n in sizes:
+            row = time_case(case, n, min_time, max_runs)
+            rows.append(row)
+            print(
+                f"{case.name:22} n={n:>7}  {row['ops_per_s']:>12.1f} ops/s  "
+                f"{row['seconds_per_op'] * 1000:>10.3f} ms/op  "
+                f"peak {row['peak_mem_bytes'] / 2 ** 20:>8.1f} MiB",
+                flush=True
+            )
+        exp = scaling_exponent(rows)
+        if exp is not None:
+            print(f"{case.name:22} scaling ~ n^{exp:.2f}", flush=True)
+        results.append({"case": case.name, "scaling": exp, "rows": rows})
+    return {"sizes": list(sizes), "results": results}
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Returns the cases which got slower than baseline by more than `threshold` (0.2 = 20%)."""
+    base = {
+        (r["case"], row["n"]): row["seconds_per_op"]
+        for r in baseline["results"] for row in r["rows"]
+    }
+    regressions = []
+    for r in current["results"]:
+        for row in r["rows"]:
+            old = base.get((r["case"], row["n"]))
+            if old and row["seconds_per_op"] > old * (1 + threshold):
+                regressions.append(
+                    f"{r['case']} n={row['n']}: {old * 1000:.3f} -> {row['seconds_per_op'] * 1000:.3f} ms/op"
+                )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_track")
+    parser.add_argument("--sizes", help="comma separated point counts (default: 1k,10k,100k,500k)")
+    parser.add_argument("--quick", action="store_true", help="only 1k and 10k points")
+    parser.add_argument("--case", action="append", help="run only this case (repeatable)")
+    parser.add_argument("--min-time", type=float, default=0.5, help="measured seconds per case and size")
+    parser.add_argument("--max-runs", type=int, default=1000)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="baseline json to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown vs baseline")
+    args = parser.parse_args(argv)
+
+    if args.sizes:
+        sizes = tuple(int(s) for s in args.sizes.split(","))
+    else:
+        sizes = QUICK_SIZES if args.quick else DEFAULT_SIZES
+
+    report = run(sizes, args.case, args.min_time, args.max_runs)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for line in regressions:
+            print("REGRESSION", line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+Synthetic track generator for the benchmarks.
+Produces Track objects and raw GPX / TCX / FIT bytes for the loaders.
+"""
+import math
+import random
+import struct
+
+from datetime import datetime, timedelta, timezone
+
+from backend.models.track import Track, TrackSegment, TrackPoint
+from backend.services.gpx import to_gpx
+
+ALL_CHANNELS = ("ele", "hr", "cadence", "power")
+EARTH_R = 6371008.8 # meters
+
+
+def make_track(
+        n_points: int,
+        rate_hz: float = 1.0,
+        channels: tuple[str, ...] = ALL_CHANNELS,
+        stucks: int = 0,
+        stuck_len: int = 20,
+        segments: int = 1,
+        speed: float = 5.0, # m/s
+        seed: int = 0,
+) -> Track:
+    """
+    Generates a random-walk track with `n_points` points split into `segments`.
+    `stucks` stretches of `stuck_len` frozen points followed by a jump are
+    placed evenly, so detect_gps_stucks() has something to find.
+    """
+    rnd = random.Random(seed)
+    dt = 1.0 / rate_hz
+    t = datetime(2024, 6, 1, 8, 0, tzinfo=timezone.utc)
+    lat, lon = 45.0, 7.0
+    ele = 500.0
+    heading = rnd.uniform(0, 2 * math.pi)
+
+    stuck_starts = set()
+    if stucks:
+        step = n_points // (stucks + 1)
+        stuck_starts = {step * (k + 1) for k in range(stucks)}
+
+    points: list[TrackPoint] = []
+    frozen = 0
+    for i in range(n_points):
+        if i in stuck_starts:
+            frozen = stuck_len
+        heading += rnd.gauss(0, 0.15)
+        d = speed * dt
+        dlat = d * math.cos(heading) / EARTH_R
+        dlon = d * math.sin(heading) / (EARTH_R * math.cos(math.radians(lat)))
+        lat += math.degrees(dlat)
+        lon += math.degrees(dlon)
+        ele = max(0.0, ele + rnd.gauss(0, 0.5))
+
+        if frozen and points:
+            # the receiver keeps reporting the same position while the real one moves on
+            frozen -= 1
+            p_lat, p_lon = points[-1].lat, points[-1].lon
+        else:
+            p_lat, p_lon = lat, lon
+
+        points.append(
+            TrackPoint(
+                lat=p_lat,
+                lon=p_lon,
+                ele=round(ele, 1) if "ele" in channels else None,
+                time=t,
+                hr=int(130 + 20 * math.sin(i / 300)) if "hr" in channels else None,
+                cadence=int(85 + rnd.randint(-5, 5)) if "cadence" in channels else None,
+                power=int(200 + rnd.randint(-40, 40)) if "power" in channels else None,
+            )
+        )
+        t += timedelta(seconds=dt)
+
+    size = math.ceil(n_points / segments)
+    segs = [TrackSegment(points=points[k:k + size]) for k in range(0, n_points, size)]
+
+    return Track(
+        segments=segs,
+        metadata={
+            "format": "gpx",
+            "name": f"synthetic-{n_points}",
+            "sport": "cycling",
+            "start_time": points[0].time if points else None,
+        }
+    )
+
+
+def gpx_bytes(track: Track) -> bytes:
+    return to_gpx(track).encode("utf-8")
+
+
+def tcx_bytes(track: Track, lap_points: int = 1000) -> bytes:
+    """
+    Writes a minimal TCX file. Laps are chunks of at most `lap_points` points;
+    at least two laps are written.
+    """
+    points = [p for s in track.segments for p in s.points]
+    lap_points = max(1, min(lap_points, math.ceil(len(points) / 2)))
+    out = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2">',
+        '<Activities><Activity Sport="Biking">',
+        f"<Id>{points[0].time.isoformat()}</Id>",
+    ]
+    for k in range(0, len(points), lap_points):
+        chunk = points[k:k + lap_points]
+        elapsed = (chunk[-1].time - chunk[0].time).total_seconds()
+        out.append(f'<Lap StartTime="{chunk[0].time.isoformat()}">')
+        out.append(f"<TotalTimeSeconds>{elapsed}</TotalTimeSeconds><TriggerMethod>Distance</TriggerMethod><Track>")
+        for p in chunk:
+            out.append("<Trackpoint>")
+            out.append(f"<Time>{p.time.isoformat()}</Time>")
+            out.append(f"<Position><LatitudeDegrees>{p.lat}</LatitudeDegrees>"
+                       f"<LongitudeDegrees>{p.lon}</LongitudeDegrees></Position>")
+            if p.ele is not None:
+                out.append(f"<AltitudeMeters>{p.ele}</AltitudeMeters>")
+            if p.hr is not None:
+                out.append(f"<HeartRateBpm><Value>{p.hr}</Value></HeartRateBpm>")
+            if p.cadence is not None:
+                out.append(f"<Cadence>{p.cadence}</Cadence>")
+            if p.power is not None:
+                out.append(f"<Extensions><TPX><Watts>{p.power}</Watts></TPX></Extensions>")
+            out.append("</Trackpoint>")
+        out.append("</Track></Lap>")
+    out.append("</Activity></Activities></TrainingCenterDatabase>")
+    return "\n".join(out).encode("utf-8")
+
+
+# ---------- FIT ----------
+_FIT_EPOCH = datetime(1989, 12, 31, tzinfo=timezone.utc)
+_CRC_TABLE = (
+    0x0000, 0xCC01, 0xD801, 0x1400, 0xF001, 0x3C00, 0x2800, 0xE401,
+    0xA001, 0x6C00, 0x7800, 0xB401, 0x5000, 0x9C01, 0x8801, 0x4400,
+)
+
+def _fit_crc(data: bytes, crc: int = 0) -> int:
+    for byte in data:
+        tmp = _CRC_TABLE[crc & 0xF]
+        crc = (crc >> 4) & 0x0FFF
+        crc = crc ^ tmp ^ _CRC_TABLE[byte & 0xF]
+        tmp = _CRC_TABLE[crc & 0xF]
+        crc = (crc >> 4) & 0x0FFF
+        crc = crc ^ tmp ^ _CRC_TABLE[(byte >> 4) & 0xF]
+    return crc
+
+def _fit_definition(local: int, global_num: int, fields: list[tuple[int, int, int]]) -> bytes:
+    out = struct.pack("<BBBHB", 0x40 | local, 0, 0, global_num, len(fields))
+    for num, size, base_type in fields:
+        out += struct.pack("<BBB", num, size, base_type)
+    return out
+
+def _fit_ts(t: datetime) -> int:
+    return int((t - _FIT_EPOCH).total_seconds())
+
+def fit_bytes(track: Track) -> bytes:
+    """Writes a minimal FIT activity: file_id, one record message per point and one lap per segment."""
+    points = [p for s in track.segments for p in s.points]
+    body = bytearray()
+
+    # file_id: type, manufacturer, time_created
+    body += _fit_definition(0, 0, [(0, 1, 0x00), (1, 2, 0x84), (4, 4, 0x86)])
+    body += struct.pack("<BBHI", 0, 4, 255, _fit_ts(points[0].time))
+
+    # record: timestamp, lat, lon, altitude, heart_rate, cadence, power
+    body += _fit_definition(1, 20, [
+        (253, 4, 0x86), (0, 4, 0x85), (1, 4, 0x85), (2, 2, 0x84),
+        (3, 1, 0x02), (4, 1, 0x02), (7, 2, 0x84),
+    ])
+    record = struct.Struct("<BIiiHBBH")
+    semicircles = 2 ** 31 / 180
+    for p in points:
+        body += record.pack(
+            1,
+            _fit_ts(p.time),
+            int(p.lat * semicircles),
+            int(p.lon * semicircles),
+            int((p.ele + 500) * 5) if p.ele is not None else 0xFFFF,
+            p.hr if p.hr is not None else 0xFF,
+            p.cadence if p.cadence is not None else 0xFF,
+            p.power if p.power is not None else 0xFFFF,
+        )
+
+    # lap: timestamp, start_time, total_elapsed_time (ms), lap_trigger (0 = manual)
+    body += _fit_definition(2, 19, [(253, 4, 0x86), (2, 4, 0x86), (7, 4, 0x86), (24, 1, 0x00)])
+    for seg in track.segments:
+        if seg.points:
+            start, end = seg.points[0].time, seg.points[-1].time
+            body += struct.pack("<BIIIB", 2, _fit_ts(end), _fit_ts(start),
+                                int((end - start).total_seconds() * 1000), 0)
+
+    header = struct.pack("<BBHI4s", 14, 0x20, 2132, len(body), b".FIT")
+    header += struct.pack("<H", _fit_crc(header))
+    data = header + bytes(body)
+    return data + struct.pack("<H", _fit_crc(data))
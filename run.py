@@ -1,9 +1,13 @@
 import uvicorn
 
+from backend import config
+
 if __name__ == "__main__":
+    # FYT_ENV=production: no reload, FYT_WORKERS worker processes
     uvicorn.run(
         "backend.main:app",
-        host="127.0.0.1",
-        port=8000,
-        reload=True
-    )
\ No newline at end of file
+        host=config.HOST,
+        port=config.PORT,
+        reload=not config.PRODUCTION,
+        workers=config.WORKERS if config.PRODUCTION else None,
+    )